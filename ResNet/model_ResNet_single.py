@@ -7,8 +7,13 @@ import torch.nn.init as init
 import torchvision
 import argparse
 import os
+import sys
 from torch.autograd import Variable
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from maxl.data import BatchTransform, make_loader, DevicePrefetcher
+from maxl.shards import open_shards
+
 """
 This program is used to train single resnet models 
 
@@ -79,6 +84,8 @@ def ResNet32():
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 parser = argparse.ArgumentParser(description='PyTorch ResNet32 CINIC10 Training')
 parser.add_argument('--outf', default='./originmodel/', help='folder to output images and model checkpoints') 
+parser.add_argument('--shards', action='store_true',
+                    help='read CINIC-10 from pre-decoded uint8 shards instead of decoding the PNG files every pass')
 args = parser.parse_args()
 
 # hyper-parameters
@@ -91,23 +98,22 @@ cinic_directory = './dataset/cinic10'
 cinic_mean = [0.47889522, 0.47227842, 0.43047404]
 cinic_std = [0.24205776, 0.23828046, 0.25874835]
 
-cinic_train = torch.utils.data.DataLoader(
-    torchvision.datasets.ImageFolder(cinic_directory + '/train',
-        transform=transforms.Compose([transforms.ToTensor(),
-        transforms.Normalize(mean=cinic_mean,std=cinic_std)])),
-    batch_size=128, shuffle=True)
-
-cinic_test = torch.utils.data.DataLoader(
-    torchvision.datasets.ImageFolder(cinic_directory + '/test',
-        transform=transforms.Compose([transforms.ToTensor(),
-        transforms.Normalize(mean=cinic_mean,std=cinic_std)])),
-    batch_size=128, shuffle=True)
-
-cinic_valid = torch.utils.data.DataLoader(
-    torchvision.datasets.ImageFolder(cinic_directory + '/valid',
-        transform=transforms.Compose([transforms.ToTensor(),
-        transforms.Normalize(mean=cinic_mean,std=cinic_std)])),
-    batch_size=128, shuffle=True)
+def cinic_loader(split):
+    # CINIC-10 split from pre-decoded uint8 shards (converted on first use), or decoded from the PNG image folder
+    if args.shards:
+        dataset = open_shards(cinic_directory + '_shards/' + split, cinic_directory + '/' + split,
+                              transform=BatchTransform(cinic_mean, cinic_std))
+        return DevicePrefetcher(make_loader(dataset, 128, shuffle=True, batched=True), device)
+    return DevicePrefetcher(make_loader(
+        torchvision.datasets.ImageFolder(cinic_directory + '/' + split,
+            transform=transforms.Compose([transforms.ToTensor(),
+            transforms.Normalize(mean=cinic_mean,std=cinic_std)])),
+        128, shuffle=True), device)
+
+
+cinic_train = cinic_loader('train')
+cinic_test = cinic_loader('test')
+cinic_valid = cinic_loader('valid')
 
 # Cifar-10 labels
 classes = ('airplane', 'automobile', 'bird', 'cat', 'deer', 'dog', 'frog', 'horse', 'ship', 'truck')
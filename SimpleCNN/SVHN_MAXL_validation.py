@@ -1,401 +1,10 @@
-from collections import OrderedDict
+import os
+import sys
 
-import torch
-import numpy as np
-import torch.nn as nn
-import torchvision.transforms as transforms
-import torch.optim as optim
-import torch.nn.functional as F
-import torch.utils.data.sampler as sampler
-from torch.utils.data import DataLoader
-from torchvision.datasets import SVHN
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from maxl.engine import main
 
-#---------------------------------------------------------This part was written by Jinna Shi---------------------------------------------#
-def ClassGenerator(label):
-    class_3 = {0: 0, 1: 1, 2: 2, 3: 0, 4: 2, 5: 2, 6: 0, 7: 1, 8: 0, 9: 0}
-    label_c3 = np.vectorize(class_3.get)(label)
-    label_c3 = torch.tensor(label_c3, dtype=torch.int64)
-    target = torch.cat((label_c3.view(label_c3.shape[0], -1), label.view(label.shape[0], -1)), 1)
-    return target
-
-class LabelGenerator(nn.Module):
-    def __init__(self, psi):
-        super(LabelGenerator, self).__init__()
-        """
-            label-generation network:
-            takes the input and generates auxiliary labels with masked softmax for an auxiliary task.
-        """
-        filter = [32, 32, 64, 128, 512]
-        self.class_nb = psi
-
-        self.block1 = self.conv_layer(3, filter[0])
-        self.block2 = self.conv_layer(filter[0], filter[1])
-        self.block3 = self.conv_layer(filter[1], filter[2])
-        self.block4 = self.conv_layer(filter[2], filter[3])
-
-        self.classifier = nn.Sequential(
-            nn.Linear(filter[-1], filter[-2]),
-            nn.ReLU(),
-            nn.Linear(filter[-2], filter[-4]),
-            nn.ReLU(),
-            nn.Linear(filter[-4], int(np.sum(self.class_nb))))
-
-        # apply weight initialisation
-        for m in self.modules():
-            if isinstance(m, nn.Conv2d):
-                nn.init.xavier_uniform_(m.weight)
-                nn.init.constant_(m.bias, 0)
-            elif isinstance(m, nn.Linear):
-                nn.init.xavier_uniform_(m.weight)
-                nn.init.constant_(m.bias, 0)
-
-    def conv_layer(self, in_channel, out_channel):
-        conv_block = nn.Sequential(
-            nn.Conv2d(in_channels=in_channel, out_channels=out_channel, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d((2,2))
-            )
-        return conv_block
-
-    # define masked softmax
-    def mask_softmax(self, x, mask, dim=1):
-        logits = torch.exp(x) * mask / torch.sum(torch.exp(x) * mask, dim=dim, keepdim=True)
-        return logits
-
-    def forward(self, x, y):       
-        out = self.block1(x)       
-        out = self.block2(out)
-        out = self.block3(out)
-        out = self.block4(out)
-        out = F.dropout(out, 0.2, training=self.training)
-        out = out.view(out.shape[0], -1)
-        out = self.classifier(out)
-
-        # build a binary mask by psi, we add epsilon=1e-8 to avoid nans
-        index = torch.zeros([len(self.class_nb), np.sum(self.class_nb)]) + 1e-8
-        for i in range(len(self.class_nb)):
-            index[i, int(np.sum(self.class_nb[:i])):np.sum(self.class_nb[:i+1])] = 1
-        mask = index[y].to(device)
-
-        label_pred = self.mask_softmax(out, mask, dim=1)
-
-        return label_pred
-
-
-class SimpleCNN(nn.Module):
-    def __init__(self, psi):
-        super(SimpleCNN, self).__init__()
-        """
-            multi-task network:
-            takes the input and predicts primary and auxiliary labels (same network structure as in human)
-        """
-        filter = [32, 32, 64, 128, 512]
-
-        self.block1 = self.conv_layer(3, filter[0])
-        self.block2 = self.conv_layer(filter[0], filter[1])
-        self.block3 = self.conv_layer(filter[1], filter[2])
-        self.block4 = self.conv_layer(filter[2], filter[3])        
-
-        # primary task prediction
-        self.classifier1 = nn.Sequential(
-            nn.Linear(filter[-1], filter[-2]),
-            nn.ReLU(),
-            nn.Linear(filter[-2], filter[-4]),
-            nn.ReLU(),
-            nn.Linear(filter[-4], len(psi)),
-            nn.Softmax(dim=1)
-        )
-
-        # auxiliary task prediction
-        self.classifier2 = nn.Sequential(
-            nn.Linear(filter[-1], filter[-2]),
-            nn.ReLU(),
-            nn.Linear(filter[-2], filter[-3]),
-            nn.ReLU(),
-            nn.Linear(filter[-3], int(np.sum(psi))),
-            nn.Softmax(dim=1)
-        )
-
-        # apply weight initialisation
-        for m in self.modules():
-            if isinstance(m, nn.Conv2d):
-                nn.init.xavier_uniform_(m.weight)
-                nn.init.constant_(m.bias, 0)
-            elif isinstance(m, nn.Linear):
-                nn.init.xavier_uniform_(m.weight)
-                nn.init.constant_(m.bias, 0)
-
-    def conv_layer(self, in_channel, out_channel):
-        conv_block = nn.Sequential(
-            nn.Conv2d(in_channels=in_channel, out_channels=out_channel, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d((2,2))
-            )
-        return conv_block
-
-    # define forward conv-layer (will be used in second-derivative step)
-    def conv_layer_ff(self, input, weights, index):         
-        net = F.conv2d(input, weights['block{:d}.0.weight'.format(index)], weights['block{:d}.0.bias'.format(index)], padding=1)
-        net = F.relu(net)
-        net = F.max_pool2d(net, kernel_size=2)
-        return net
-
-    # define forward fc-layer (will be used in second-derivative step)
-    def dense_layer_ff(self, input, weights, index):
-        net = F.linear(input, weights['classifier{:d}.0.weight'.format(index)], weights['classifier{:d}.0.bias'.format(index)])
-        net = F.relu(net)
-        net = F.linear(net, weights['classifier{:d}.2.weight'.format(index)], weights['classifier{:d}.2.bias'.format(index)])
-        net = F.relu(net)
-        net = F.linear(net, weights['classifier{:d}.4.weight'.format(index)], weights['classifier{:d}.4.bias'.format(index)])        
-        net = F.softmax(net, dim=1)
-        return net
-
-    def forward(self, x, weights=None):
-        """
-            if no weights given, use the direct training strategy and update network paramters
-            else retain the computational graph which will be used in second-derivative step
-        """
-        if weights is None:
-            out = self.block1(x)       
-            out = self.block2(out)
-            out = self.block3(out)
-            out = self.block4(out)
-            out = F.dropout(out, 0.2, training=self.training)
-            out = out.view(out.shape[0], -1)
-            t1_pred = self.classifier1(out)
-            t2_pred = self.classifier2(out)
-
-        else:
-            out = self.conv_layer_ff(x, weights, 1)
-            out = self.conv_layer_ff(out, weights, 2)
-            out = self.conv_layer_ff(out, weights, 3)
-            out = self.conv_layer_ff(out, weights, 4)
-            out = F.dropout(out, 0.2, training=self.training)
-            out = out.view(out.shape[0], -1)
-
-            t1_pred = self.dense_layer_ff(out, weights, 1)
-            t2_pred = self.dense_layer_ff(out, weights, 2)
-
-        return t1_pred, t2_pred
-
-    def model_fit(self, x_pred, x_output, pri=True, num_output=3):
-        if not pri:
-            # generated auxiliary label is a soft-assignment vector (no need to change into one-hot vector)
-            x_output_onehot = x_output
-        else:
-            # convert a single label into a one-hot vector
-            x_output_onehot = torch.zeros((len(x_output), num_output)).to(device)
-            x_output_onehot.scatter_(1, x_output.unsqueeze(1), 1)
-
-        # apply focal loss
-        loss = x_output_onehot * (1 - x_pred)**2 * torch.log(x_pred + 1e-20)
-        return torch.sum(-loss, dim=1)
-
-    def model_entropy(self, x_pred1):
-        # compute entropy loss
-        x_pred1 = torch.mean(x_pred1, dim=0)
-        loss1 = x_pred1 * torch.log(x_pred1 + 1e-20)
-        return torch.sum(loss1)
-
-# fix random seed for reproducibility
-seed = 7
-torch.manual_seed(seed)
-torch.cuda.manual_seed(seed)
-torch.backends.cudnn.deterministic = True
-
-# convert each image to tensor format
-transform = transforms.Compose([
-    transforms.ToTensor()  # convert to tensor
-])
-
-batch_size = 128
-
-# load data
-trainset = SVHN(".", split='train', download=True, transform=transform)
-testset = SVHN(".", split='test', download=True, transform=transform)
-valset = SVHN(".", split='extra', download=True, transform=transform)
-
-# create data loaders
-trainloader = DataLoader(trainset, batch_size=batch_size, shuffle=True)
-testloader = DataLoader(testset, batch_size=batch_size, shuffle=True)
-valloader = DataLoader(valset, batch_size=batch_size, shuffle=True)
-
-#-----------------------------This part was borrowed by the author https://github.com/lorenmt/maxl---------------------------------------#
-#
-# define label-generation model,
-# and optimiser with learning rate 1e-3, drop half for every 50 epochs, weight_decay=5e-4,
-psi = [3]*10  # for each primary class split into 5 auxiliary classes, with total 100 auxiliary classes
-device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-LabelGenerator = LabelGenerator(psi=psi).to(device)
-gen_optimizer = optim.Adam(LabelGenerator.parameters(), weight_decay=5e-4)
-gen_scheduler = optim.lr_scheduler.StepLR(gen_optimizer, step_size=10, gamma=0.5)
-
-# define parameters
-total_epoch = 30
-train_batch = len(trainloader)
-test_batch = len(testloader)
-val_batch = len(valloader)
-
-# define multi-task network, and optimiser with learning rate 0.01, drop half for every 50 epochs
-model = SimpleCNN(psi=psi).to(device)
-optimizer = optim.Adam(model.parameters())
-scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=10, gamma=0.5)
-avg_cost = np.zeros([total_epoch, 9], dtype=np.float32)
-lr = 0.001  # define learning rate for second-derivative step (theta_1^+)
-k = 0
-for index in range(total_epoch):
-    cost = np.zeros(4, dtype=np.float32)
-
-    # drop the learning rate with the same strategy in the multi-task network
-    # note: not necessary to be consistent with the multi-task network's parameter,
-    # it can also be learned directly from the network
-    if (index + 1) % 10 == 0:
-       lr = lr * 0.5
-
-    # evaluate training data (training-step, update on theta_1)
-    model.train()
-    train_dataset = iter(trainloader)
-    for i in range(train_batch):
-        train_data, train_label = train_dataset.next()
-        train_label = ClassGenerator(train_label)
-        train_label = train_label.type(torch.LongTensor)
-        train_data, train_label = train_data.to(device), train_label.to(device)
-        train_pred1, train_pred2 = model(train_data)
-        train_pred3 = LabelGenerator(train_data, train_label[:, 1])  # generate auxiliary labels
-
-        # reset optimizers with zero gradient
-        optimizer.zero_grad()
-        gen_optimizer.zero_grad()
-
-        # choose level 2/3 hierarchy, 20-class (gt) / 100-class classification (generated by labelgeneartor)
-        train_loss1 = model.model_fit(train_pred1, train_label[:, 1], pri=True, num_output=10)
-        train_loss2 = model.model_fit(train_pred2, train_pred3, pri=False, num_output=30)
-        train_loss3 = model.model_entropy(train_pred3)
-
-        # compute cosine similarity between gradients from primary and auxiliary loss
-        grads1 = torch.autograd.grad(torch.mean(train_loss1), model.parameters(), retain_graph=True, allow_unused=True)
-        grads2 = torch.autograd.grad(torch.mean(train_loss2), model.parameters(), retain_graph=True, allow_unused=True)
-        cos_mean = 0
-        for k in range(len(grads1) - 12):  # only compute on shared representation (ignore task-specific fc-layers)
-            cos_mean += torch.mean(F.cosine_similarity(grads1[k], grads2[k], dim=0)) / (len(grads1) - 12)
-        # cosine similarity evaluation ends here
-
-        train_loss = torch.mean(train_loss1) + torch.mean(train_loss2)
-        train_loss.backward()
-
-        optimizer.step()
-
-        train_predict_label1 = train_pred1.data.max(1)[1]
-        train_acc1 = train_predict_label1.eq(train_label[:, 1]).sum().item() / batch_size
-
-        cost[0] = torch.mean(train_loss1).item()
-        cost[1] = train_acc1
-        cost[2] = cos_mean
-        k = k + 1
-        avg_cost[index][0:3] += cost[0:3] / train_batch
-
-    # evaluating training data (meta-training step, update on theta_2)
-    train_dataset = iter(trainloader)
-    for i in range(train_batch):
-        train_data, train_label = train_dataset.next()
-        train_label = ClassGenerator(train_label)
-        train_label = train_label.type(torch.LongTensor)
-        train_data, train_label = train_data.to(device), train_label.to(device)
-        train_pred1, train_pred2 = model(train_data)
-        train_pred3 = LabelGenerator(train_data, train_label[:, 1])
-
-        # reset optimizer with zero gradient
-        optimizer.zero_grad()
-        gen_optimizer.zero_grad()
-
-        # choose level 2/3 hierarchy, 20-class/100-class classification
-        train_loss1 = model.model_fit(train_pred1, train_label[:, 1], pri=True, num_output=10)
-        train_loss2 = model.model_fit(train_pred2, train_pred3, pri=False, num_output=30)
-        train_loss3 = model.model_entropy(train_pred3)
-
-        # multi-task loss
-        train_loss = torch.mean(train_loss1) + torch.mean(train_loss2)
-
-        # current accuracy on primary task
-        train_predict_label1 = train_pred1.data.max(1)[1]
-        train_acc1 = train_predict_label1.eq(train_label[:, 1]).sum().item() / batch_size
-        cost[0] = torch.mean(train_loss1).item()
-        cost[1] = train_acc1
-
-        # current theta_1
-        fast_weights = OrderedDict((name, param) for (name, param) in model.named_parameters())
-
-        # create_graph flag for computing second-derivative
-        grads = torch.autograd.grad(train_loss, model.parameters(), create_graph=True)
-        data = [p.data for p in list(model.parameters())]
-
-        # compute theta_1^+ by applying sgd on multi-task loss
-        fast_weights = OrderedDict((name, param - lr * grad) for ((name, param), grad, data) in zip(fast_weights.items(), grads, data))
-
-        # compute primary loss with the updated thetat_1^+
-        train_pred1, train_pred2 = model.forward(train_data, fast_weights)
-        train_loss1 = model.model_fit(train_pred1, train_label[:, 1], pri=True, num_output=10)
-
-        # update theta_2 with primary loss + entropy loss
-        (torch.mean(train_loss1) + 0.2*torch.mean(train_loss3)).backward()
-        gen_optimizer.step()
-
-        train_predict_label1 = train_pred1.data.max(1)[1]
-        train_acc1 = train_predict_label1.eq(train_label[:, 1]).sum().item() / batch_size
-
-        # accuracy on primary task after one update
-        cost[2] = torch.mean(train_loss1).item()
-        cost[3] = train_acc1
-        avg_cost[index][3:7] += cost[0:4] / train_batch
-
-    scheduler.step()
-    gen_scheduler.step()
-
-    # evaluate on test data
-    model.eval()
-    with torch.no_grad():
-        val_dataset = iter(valloader)
-        for i in range(val_batch):
-            val_data, val_label = val_dataset.next()
-            val_label = ClassGenerator(val_label)
-            val_label = val_label.type(torch.LongTensor)
-            val_data, val_label = val_data.to(device), val_label.to(device)
-            val_pred1, val_pred2 = model(val_data)
-
-            val_loss1 = model.model_fit(val_pred1, val_label[:, 1], pri=True, num_output=10)
-
-            val_predict_label1 = val_pred1.data.max(1)[1]
-            val_acc1 = val_predict_label1.eq(val_label[:, 1]).sum().item() / batch_size
-
-            cost[0] = torch.mean(val_loss1).item()
-            cost[1] = val_acc1
-
-            avg_cost[index][7:] += cost[0:2] / val_batch
-
-    print('EPOCH: {:04d} Iter {:04d} | TRAIN [LOSS|ACC.]: PRI {:.4f} {:.4f} COSSIM {:.4f} || '
-          'META [LOSS|ACC.]: PRE {:.4f} {:.4f} AFTER {:.4f} {:.4f} || TEST: {:.4f} {:.4f}'
-          .format(index, k, avg_cost[index][0], avg_cost[index][1], avg_cost[index][2], avg_cost[index][3],
-                  avg_cost[index][4], avg_cost[index][5], avg_cost[index][6], avg_cost[index][7], avg_cost[index][8]))
-
-# evaluate on test data
-test_cost = np.zeros(2, dtype=np.float32)
-cost = np.zeros(2, dtype=np.float32)
-model.eval()
-with torch.no_grad():
-    test_dataset = iter(testloader)
-    for i in range(test_batch):
-        test_data, test_label = test_dataset.next()
-        test_label = ClassGenerator(test_label)
-        test_label = test_label.type(torch.LongTensor)
-        test_data, test_label = test_data.to(device), test_label.to(device)
-        test_pred1, test_pred2 = model(test_data)
-
-        test_loss1 = model.model_fit(test_pred1, test_label[:, 1], pri=True, num_output=10)
-
-        test_predict_label1 = test_pred1.data.max(1)[1]
-        test_acc1 = test_predict_label1.eq(test_label[:, 1]).sum().item() / batch_size
-
-        cost[0] = torch.mean(test_loss1).item()
-        cost[1] = test_acc1
-
-        test_cost += cost[0:2] / test_batch
\ No newline at end of file
+# MAXL SimpleCNN on SVHN, validated on a stratified subset of the extra split: the 'svhn-validation' preset of maxl/engine.py,
+# every engine option can be given on the command line (see --help)
+if __name__ == '__main__':
+    main(['--preset', 'svhn-validation'] + sys.argv[1:])
\ No newline at end of file
@@ -1,5 +1,8 @@
 # from create_dataset import *
 
+import os
+import sys
+import argparse
 import numpy as np
 import torchvision
 
@@ -9,6 +12,9 @@ import torchvision.transforms as transforms
 import torch.optim as optim
 import torch.nn.functional as F
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from maxl.data import load_packed, PackedDataset, BatchTransform, make_loader, DevicePrefetcher
+
 
 class VGG16(nn.Module):
     def __init__(self):
@@ -90,23 +96,45 @@ class VGG16(nn.Module):
 
 
 
+parser = argparse.ArgumentParser(description='Single-task VGG16 CIFAR10 Training')
+parser.add_argument('--packed', action='store_true',
+                    help='serve whole batches from a packed uint8 cache of CIFAR-10 instead of decoding every image')
+args = parser.parse_args()
+
 transform = transforms.Compose(
     [transforms.ToTensor(),
      transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))])
 
-trainset = torchvision.datasets.CIFAR10(root='./data', train=True,
-                                        download=True, transform=transform)
-cifar10_train_loader = torch.utils.data.DataLoader(trainset, batch_size=100,
-                                          shuffle=True, num_workers=2)
 
-testset = torchvision.datasets.CIFAR10(root='./data', train=False,
-                                       download=True, transform=transform)
-cifar10_test_loader = torch.utils.data.DataLoader(testset, batch_size=100,
-                                         shuffle=False, num_workers=2)
+def packed_cifar10(train):
+    # uint8 NCHW images and labels, built once from the torchvision dataset
+    dataset = torchvision.datasets.CIFAR10(root='./data', train=train, download=True)
+    return dataset.data.transpose((0, 3, 1, 2)), np.array(dataset.targets)
 
 
-# define VGG-16 model, and optimiser with learning rate 0.01, drop half for every 50 epochs
+batch_size = 100
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+if args.packed:
+    trainset = PackedDataset(*load_packed('./data/cifar10_packed_train', lambda: packed_cifar10(True)),
+                             transform=BatchTransform((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)))
+    cifar10_train_loader = make_loader(trainset, batch_size, shuffle=True, num_workers=0, batched=True)
+
+    testset = PackedDataset(*load_packed('./data/cifar10_packed_test', lambda: packed_cifar10(False)),
+                            transform=BatchTransform((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)))
+    cifar10_test_loader = make_loader(testset, batch_size, shuffle=False, num_workers=0, batched=True)
+else:
+    trainset = torchvision.datasets.CIFAR10(root='./data', train=True,
+                                            download=True, transform=transform)
+    cifar10_train_loader = make_loader(trainset, batch_size, shuffle=True)
+
+    testset = torchvision.datasets.CIFAR10(root='./data', train=False,
+                                           download=True, transform=transform)
+    cifar10_test_loader = make_loader(testset, batch_size, shuffle=False)
+cifar10_train_loader = DevicePrefetcher(cifar10_train_loader, device)
+cifar10_test_loader = DevicePrefetcher(cifar10_test_loader, device)
+
+
+# define VGG-16 model, and optimiser with learning rate 0.01, drop half for every 50 epochs
 VGG16 = VGG16().to(device)
 optimizer = optim.SGD(VGG16.parameters(), lr=0.01)
 scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=50, gamma=0.5)
@@ -123,10 +151,8 @@ for index in range(total_epoch):
 
     # evaluate training data
     VGG16.train()
-    cifar10_train_dataset = iter(cifar10_train_loader)
-    for i in range(train_batch):
-        train_data, train_label = cifar10_train_dataset.next()
-        train_label = train_label.type(torch.LongTensor)
+    for train_data, train_label in cifar10_train_loader:
+        train_label = train_label.long()
         train_data, train_label = train_data.to(device), train_label.to(device)
         train_pred1 = VGG16(train_data)
 
@@ -157,10 +183,8 @@ for index in range(total_epoch):
     # evaluating test data
     VGG16.eval()
     with torch.no_grad():
-        cifar10_test_dataset = iter(cifar10_test_loader)
-        for i in range(test_batch):
-            test_data, test_label = cifar10_test_dataset.next()
-            test_label = test_label.type(torch.LongTensor)
+        for test_data, test_label in cifar10_test_loader:
+            test_label = test_label.long()
             test_data, test_label = test_data.to(device), test_label.to(device)
             test_pred1 = VGG16(test_data)
 
@@ -0,0 +1,3 @@
+"""
+    Shared building blocks for the MAXL training scripts (SimpleCNN, VGG16 and ResNet).
+"""
@@ -0,0 +1,172 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from collections import OrderedDict
+
+import torch
+import torch.optim as optim
+
+from maxl.models import (SimpleCNN, SimpleCNNLabelGenerator, VGG16, VGG16LabelGenerator, ResNet32, ResNetLabelGenerator,
+                         mnist_simple_cnn, mnist_label_generator)
+from maxl.timing import PhaseTimer, phase, rss, reset_peak_rss, peak_rss
+from maxl.train import train_step, meta_step
+
+
+# networks of the training scripts, with the image shape of their dataset
+CONFIGS = OrderedDict([
+    ('simplecnn-mnist', ((1, 28, 28), mnist_simple_cnn, mnist_label_generator)),
+    ('simplecnn-svhn', ((3, 32, 32), SimpleCNN, SimpleCNNLabelGenerator)),
+    ('vgg16-cifar10', ((3, 32, 32), VGG16, VGG16LabelGenerator)),
+    ('resnet32-cinic10', ((3, 32, 32), ResNet32, ResNetLabelGenerator)),
+])
+
+# benchmarked steps: the training step (theta_1), the meta-training step (theta_2),
+# evaluation of the multi-task network and the label generator forward
+BENCHMARKS = ('train', 'meta', 'eval', 'generate')
+
+
+def random_batches(shape, batch_size, device, count=4):
+    # a few random batches, cycled through, so no dataset is needed
+    return [(torch.randn((batch_size,) + shape, device=device), torch.randint(10, (batch_size,), device=device))
+            for _ in range(count)]
+
+
+def make_step(benchmark, model, label_generator, lr, meta_grad):
+    """
+        step(data, label, timer) of a benchmark, with fresh SGD optimisers for the two networks.
+    """
+    optimizer = optim.SGD(model.parameters(), lr=0.01)
+    gen_optimizer = optim.SGD(label_generator.parameters(), lr=1e-3, weight_decay=5e-4)
+
+    if benchmark == 'train':
+        model.train()
+        return lambda data, label, timer=None: train_step(model, label_generator, optimizer, gen_optimizer, data, label,
+                                                          timer=timer)
+    if benchmark == 'meta':
+        model.train()
+        return lambda data, label, timer=None: meta_step(model, label_generator, optimizer, gen_optimizer, data, label, lr,
+                                                         meta_grad, timer=timer)
+
+    def forward(data, label, timer=None):
+        with phase(timer, 'forward' if benchmark == 'eval' else 'gen_forward', len(label)), torch.no_grad():
+            return model(data) if benchmark == 'eval' else label_generator(data, label)
+
+    model.eval()
+    return forward
+
+
+def synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def measure(step, batches, device, warmup, steps):
+    """
+        steady-state throughput of step over batches (after warmup steps) and the peak memory of the timed steps
+        (on linux the peak process rss above the rss at their start and its absolute value, the rss at their end
+        elsewhere), followed by one step through a PhaseTimer
+        for the peak memory and saved-tensor bytes of each phase.
+    """
+    for i in range(warmup):
+        step(*batches[i % len(batches)])
+    synchronize(device)
+    if device.type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+    hwm = reset_peak_rss()
+    start_rss = rss() if hwm else None
+
+    start = time.perf_counter()
+    for i in range(steps):
+        step(*batches[i % len(batches)])
+    synchronize(device)
+    seconds = time.perf_counter() - start
+
+    samples = steps * len(batches[0][1])
+    result = {'samples_per_sec': samples / seconds, 'step_ms': 1000 * seconds / steps}
+    if hwm:
+        peak = peak_rss()
+        result.update(peak_rss=peak - start_rss, hwm_rss=peak)
+    else:
+        result['end_rss'] = rss()
+    if device.type == 'cuda':
+        result.update(cuda_allocated=torch.cuda.max_memory_allocated(device),
+                      cuda_reserved=torch.cuda.max_memory_reserved(device))
+
+    timer = PhaseTimer(device, memory=True)
+    step(*batches[0], timer=timer)
+    result['phases'] = timer.memory_summary()
+    return result
+
+
+def run(configs, batch_sizes, psis, meta_grads, benchmarks=BENCHMARKS, warmup=5, steps=20, device=None, lr=0.01):
+    """
+        every benchmark of every config, batch size, psi (auxiliary classes per primary class) and meta-gradient mode,
+        returns a list of result records. a step running out of cuda memory is recorded as such.
+    """
+    device = torch.device(device or ('cuda:0' if torch.cuda.is_available() else 'cpu'))
+    results = []
+    for name in configs:
+        shape, build_model, build_generator = CONFIGS[name]
+        for batch_size in batch_sizes:
+            batches = random_batches(shape, batch_size, device)
+            for psi in psis:
+                for meta_grad in meta_grads:
+                    for benchmark in benchmarks:
+                        if benchmark != 'meta' and meta_grad != meta_grads[0]:
+                            # only the meta step depends on the meta-gradient mode
+                            continue
+                        record = OrderedDict([('config', name), ('benchmark', benchmark), ('batch_size', batch_size),
+                                              ('psi', psi), ('meta_grad', meta_grad if benchmark == 'meta' else None)])
+                        torch.manual_seed(0)
+                        model = build_model([psi] * 10).to(device)
+                        label_generator = build_generator([psi] * 10).to(device)
+                        step = make_step(benchmark, model, label_generator, lr, meta_grad)
+                        try:
+                            record.update(measure(step, batches, device, warmup, steps))
+                        except torch.cuda.OutOfMemoryError:
+                            record['error'] = 'out of memory'
+                        del model, label_generator, step
+                        if device.type == 'cuda':
+                            torch.cuda.empty_cache()
+                        print(json.dumps(record), file=sys.stderr)
+                        results.append(record)
+    return results
+
+
+def environment(device=None):
+    device = torch.device(device or ('cuda:0' if torch.cuda.is_available() else 'cpu'))
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'torch': torch.__version__,
+            'platform': platform.platform(), 'device': str(device), 'threads': torch.get_num_threads(),
+            'device_name': torch.cuda.get_device_name(device) if device.type == 'cuda' else platform.processor()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='MAXL step throughput and memory on synthetic data')
+    parser.add_argument('--configs', nargs='+', default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS), choices=BENCHMARKS)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[32, 128])
+    parser.add_argument('--psi', type=int, nargs='+', default=[3, 5],
+                        help='auxiliary classes per primary class')
+    parser.add_argument('--meta-grad', nargs='+', default=['second-order'], choices=['second-order', 'finite-difference'])
+    parser.add_argument('--warmup', type=int, default=5, help='untimed steps before every measurement')
+    parser.add_argument('--steps', type=int, default=20, help='timed steps of every measurement')
+    parser.add_argument('--device', default=None, help='cuda:0 if available, else cpu')
+    parser.add_argument('--output', default=None, help='json file for the results (stdout by default)')
+    args = parser.parse_args(argv)
+
+    results = run(args.configs, args.batch_sizes, args.psi, args.meta_grad, args.benchmarks, args.warmup, args.steps,
+                  args.device)
+    report = {'environment': environment(args.device), 'arguments': vars(args), 'results': results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    # python -m maxl.benchmark --configs vgg16-cifar10 --batch-sizes 100 --output vgg16.json
+    main()
@@ -0,0 +1,223 @@
+import atexit
+import os
+import queue
+import random
+import threading
+
+import numpy as np
+import torch
+import torch.utils.data as data
+
+
+def rng_state():
+    return {'python': random.getstate(), 'numpy': np.random.get_state(), 'torch': torch.get_rng_state(),
+            'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None}
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if state['cuda'] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+class ResumableSampler(data.Sampler):
+    """
+        random sampler whose order only depends on (seed, pass), so a run can be resumed at a batch boundary:
+        every iteration (one pass over the data) draws the next permutation. state_dict(consumed) records the pass
+        in progress and how many of its samples were already consumed, state_dict() the position between passes.
+        the seed is part of the state, so a restored sampler keeps the order of the run it was saved from.
+    """
+    def __init__(self, data_source, seed):
+        self.num_samples = len(data_source)
+        self.seed = seed
+        self.passes = 0
+        self.start = 0
+
+    def __iter__(self):
+        generator = torch.Generator().manual_seed(self.seed + self.passes)
+        order = torch.randperm(self.num_samples, generator=generator)[self.start:]
+        self.passes, self.start = self.passes + 1, 0
+        return iter(order.tolist())
+
+    def __len__(self):
+        return self.num_samples - self.start
+
+    def state_dict(self, consumed=None):
+        if consumed is None:
+            return {'seed': self.seed, 'passes': self.passes, 'start': 0}
+        return {'seed': self.seed, 'passes': self.passes - 1, 'start': consumed}
+
+    def load_state_dict(self, state):
+        self.seed, self.passes, self.start = state['seed'], state['passes'], state['start']
+
+    def batches(self, batch_size):
+        """
+            number of batches of batch_size served before the current position, every pass ending on its own
+            (possibly ragged) last batch: the passes before the one in progress and the batches consumed of it.
+        """
+        per_pass = -(-self.num_samples // batch_size)
+        return self.passes * per_pass + -(-self.start // batch_size)
+
+
+def snapshot(obj):
+    """
+        host copy of a (nested) state: tensors are copied to cpu memory and numpy arrays are copied,
+        so training can go on modifying the originals while the copy is written.
+    """
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, np.ndarray):
+        return obj.copy()
+    if isinstance(obj, dict):
+        return type(obj)((key, snapshot(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)
+    return obj
+
+
+def atomic_save(state, path):
+    """
+        torch.save to a temporary file, fsync and rename over path, so path always holds a complete file.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        torch.save(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+    try:
+        # make the rename itself durable (not supported on every platform)
+        directory = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+        os.fsync(directory)
+        os.close(directory)
+    except OSError:
+        pass
+
+
+class CheckpointWriter(object):
+    """
+        background checkpoint writer: save() snapshots the state to host memory on the calling thread,
+        serialisation and atomic_save run on a single background thread (in submission order).
+        saves sharing a series keep only their last `keep` files plus the best-scoring one (higher is better),
+        which files to drop is decided on the calling thread, so state_dict() (saved with the training state)
+        always matches the saves submitted so far. an error of the background thread is raised by the next
+        save() or close(), close() also stops the thread.
+    """
+    def __init__(self, keep=3):
+        if keep < 1:
+            raise ValueError('keep must be at least 1, got {}'.format(keep))
+        self.keep = keep
+        self.history = {}
+        self.best = {}
+        self.error = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        # pending checkpoints are still written if the script ends or fails
+        atexit.register(self.close)
+
+    def save(self, path, state, series=None, score=None):
+        self._check()
+        if self.thread is None:
+            raise ValueError('save() on a closed CheckpointWriter')
+        removed = self._retain(series, path, score) if series is not None else []
+        self.queue.put((path, snapshot(state), removed))
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            atexit.unregister(self.close)
+        self._check()
+
+    def state_dict(self):
+        return {'history': {series: list(paths) for series, paths in self.history.items()}, 'best': dict(self.best)}
+
+    def load_state_dict(self, state):
+        self.history = {series: list(paths) for series, paths in state['history'].items()}
+        self.best = dict(state['best'])
+
+    def _check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, state, removed = item
+            try:
+                atomic_save(state, path)
+                for old in removed:
+                    if os.path.exists(old):
+                        os.remove(old)
+            except Exception as error:
+                self.error = error
+
+    def _retain(self, series, path, score):
+        # record path in its series, returns the files that fall out of it
+        history = self.history.setdefault(series, [])
+        if path in history:
+            history.remove(path)
+        history.append(path)
+        if score is not None and (series not in self.best or score > self.best[series][1]):
+            self.best[series] = (path, score)
+
+        best = self.best.get(series, (None, None))[0]
+        removed = [old for old in history[:-self.keep] if old != best]
+        for old in removed:
+            history.remove(old)
+        return removed
+
+
+class Checkpoint(object):
+    """
+        full training state in one file: every object with state_dict()/load_state_dict() (networks, optimizers,
+        schedulers, the ResumableSampler of the training data), the rng states and plain values (epoch, learning rate,
+        avg_cost, ...). progress is the train_epoch state of a checkpoint saved mid-epoch (None at epoch ends),
+        step() is meant as the on_batch hook of train_epoch and saves every `every` batches.
+        the file is written through writer (a CheckpointWriter) if given, else synchronously, always atomically.
+        the rng of DataLoader worker processes is not part of the state, so augmentation drawn in workers
+        (torchvision transforms) differs after a resume, a seeded BatchTransform is repositioned from the sampler.
+    """
+    def __init__(self, path, every=0, writer=None, **objects):
+        self.path = path
+        self.every = every
+        self.writer = writer
+        self.objects = objects
+        self.batches = 0
+
+    def save(self, progress=None, **values):
+        states = {}
+        for name, obj in self.objects.items():
+            if isinstance(obj, ResumableSampler) and progress is not None:
+                states[name] = obj.state_dict(progress['samples'])
+            else:
+                states[name] = obj.state_dict()
+        state = {'objects': states, 'rng': rng_state(), 'progress': progress, 'values': values}
+
+        if self.writer is not None:
+            self.writer.save(self.path, state)
+        else:
+            atomic_save(state, self.path)
+
+    def step(self, progress, **values):
+        self.batches += 1
+        if self.every and self.batches % self.every == 0:
+            self.save(progress, **values)
+
+    def load(self):
+        """
+            restore every object and the rng states, returns (progress, values) of the saved state.
+        """
+        state = torch.load(self.path, map_location='cpu', weights_only=False)
+        for name, obj in self.objects.items():
+            obj.load_state_dict(state['objects'][name])
+        set_rng_state(state['rng'])
+        return state['progress'], state['values']
@@ -0,0 +1,202 @@
+import os
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+import torch.utils.data as data
+
+
+def load_packed(path, build):
+    """
+        packed dataset cache: uint8 NCHW images and integer labels stored as path_images.npy / path_labels.npy.
+        build() returns (images, labels) as numpy arrays and is only called when the cache does not exist yet,
+        afterwards both arrays are memory-mapped (copy-on-write) from disk and returned as tensors.
+    """
+    image_path, label_path = path + '_images.npy', path + '_labels.npy'
+    if not (os.path.exists(image_path) and os.path.exists(label_path)):
+        images, labels = build()
+        os.makedirs(os.path.dirname(image_path) or '.', exist_ok=True)
+        # write to a temporary file first, so an interrupted build never leaves a truncated cache behind
+        for array, target in ((np.ascontiguousarray(images, dtype=np.uint8), image_path),
+                              (np.ascontiguousarray(labels, dtype=np.int64), label_path)):
+            with open(target + '.tmp', 'wb') as f:
+                np.save(f, array)
+            os.replace(target + '.tmp', target)
+
+    images = torch.from_numpy(np.load(image_path, mmap_mode='c'))
+    labels = torch.from_numpy(np.load(label_path, mmap_mode='c'))
+    return images, labels
+
+
+class PackedDataset(data.Dataset):
+    """
+        dataset over packed uint8 images, indexed by a whole batch of indices at once
+        (use with batch_loader), transform is applied to the uint8 image batch.
+    """
+    def __init__(self, images, labels, transform=None):
+        self.images = images
+        self.labels = labels
+        self.transform = transform
+
+    def __getitem__(self, index):
+        index = torch.as_tensor(index)
+        images = self.images[index]
+        if self.transform is not None:
+            images = self.transform(images)
+        return images, self.labels[index]
+
+    def __len__(self):
+        return len(self.labels)
+
+
+def packed_svhn(root, split, transform=None):
+    """
+        SVHN split as a PackedDataset over root/svhn_<split>_images.npy / _labels.npy. the .mat file is parsed
+        (through torchvision) only when the cache is built, later runs memory-map the cache, so concurrent runs
+        share the page cache instead of each holding its own copy of the split.
+    """
+    def build():
+        import torchvision
+        dataset = torchvision.datasets.SVHN(root, split=split, download=True)
+        return dataset.data, dataset.labels
+
+    return PackedDataset(*load_packed(os.path.join(root, 'svhn_' + split), build), transform=transform)
+
+
+def stratified_subset(labels, size, seed=0, path=None):
+    """
+        sorted indices of a class-stratified random subset of (about) size samples, every class keeps its share
+        of labels. with path set, the indices are saved on first use and reloaded afterwards, so the subset is fixed.
+    """
+    if path is not None and os.path.exists(path):
+        return np.load(path)
+
+    labels = np.asarray(labels)
+    rng = np.random.RandomState(seed)
+    classes, counts = np.unique(labels, return_counts=True)
+    share = counts * min(size, len(labels)) / len(labels)
+    quota = np.floor(share).astype(np.int64)
+    # hand the rounding remainder to the classes with the largest fractional share
+    quota[np.argsort(quota - share)[:int(round(share.sum())) - quota.sum()]] += 1
+    indices = np.sort(np.concatenate([rng.choice(np.flatnonzero(labels == c), q, replace=False) for c, q in zip(classes, quota)]))
+
+    if path is not None:
+        np.save(path, indices)
+    return indices
+
+
+class BatchTransform(object):
+    """
+        batch version of RandomCrop(padding) + RandomHorizontalFlip + ToTensor + Normalize(mean, std)
+        for uint8 NCHW image batches, padding=0 and flip=False give the plain test-time transform.
+        crops and flips are drawn for the whole batch at once and applied with one gather, with seed set
+        the random draws of the b-th transformed batch come from a generator seeded with seed + b.
+    """
+    def __init__(self, mean, std, padding=0, flip=False, seed=None):
+        # ToTensor and Normalize fused into one multiply-add: x / 255 / std - mean / std
+        self.scale = 1 / (255 * torch.tensor(std).view(1, -1, 1, 1))
+        self.shift = -torch.tensor(mean).view(1, -1, 1, 1) / torch.tensor(std).view(1, -1, 1, 1)
+        self.padding = padding
+        self.flip = flip
+        self.seed = seed
+        self.generator = torch.Generator()
+        self.batch = 0
+
+    def __call__(self, images):
+        if self.padding or self.flip:
+            images = self.augment(images)
+        return torch.addcmul(self.shift, images.float(), self.scale)
+
+    def augment(self, images):
+        if self.seed is None:
+            generator = None
+        else:
+            generator = self.generator.manual_seed(self.seed + self.batch)
+            self.batch += 1
+
+        # zero-padded random crop: per-image row/column offsets into the padded batch
+        n, height, width = len(images), images.shape[2], images.shape[3]
+        offsets = torch.randint(2 * self.padding + 1, (n, 2), generator=generator)
+        rows = offsets[:, :1] + torch.arange(height)
+        cols = torch.arange(width).expand(n, width)
+        if self.flip:
+            # a horizontal flip reads the crop columns in reverse order
+            flip = torch.rand(n, 1, generator=generator) < 0.5
+            cols = torch.where(flip, cols.flip(1), cols)
+        cols = cols + offsets[:, 1:]
+
+        padded = F.pad(images, [self.padding] * 4) if self.padding else images
+        # advanced indices around the channel slice give an NHWC result, copied back to a contiguous NCHW batch
+        # (the permuted view would carry channels-last strides into the networks, whose flattening .view() fails on them)
+        images = padded[torch.arange(n).view(-1, 1, 1), :, rows.unsqueeze(2), cols.unsqueeze(1)]
+        return images.permute(0, 3, 1, 2).contiguous()
+
+
+def loader_workers():
+    """
+        default number of loader workers: every available core but one (kept for the training loop), at most 8.
+    """
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    return max(0, min(cores - 1, 8))
+
+
+def make_loader(dataset, batch_size, shuffle=False, num_workers=None, prefetch_factor=4, pin_memory=None, batched=False,
+                sampler=None):
+    """
+        shared DataLoader factory, num_workers defaults to loader_workers() and pin_memory to cuda availability.
+        workers are kept alive across epochs (and the two passes of a MAXL epoch) and each keeps prefetch_factor
+        batches in flight. batched=True serves whole batches from a batch-indexed dataset such as PackedDataset,
+        where every loaded item is already a batch, so automatic batching is disabled.
+        sampler (e.g. a checkpoint.ResumableSampler) replaces the shuffled or sequential order.
+    """
+    if num_workers is None:
+        num_workers = loader_workers()
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    # the loader draws its shuffling and worker seeds from its own generator (seeded once from the global one),
+    # so iterating it does not advance the global rng, which a resumed run restores mid-epoch
+    generator = torch.Generator().manual_seed(int(torch.empty((), dtype=torch.int64).random_()))
+    kwargs = {'num_workers': num_workers, 'pin_memory': pin_memory, 'generator': generator}
+    if num_workers > 0:
+        kwargs.update(persistent_workers=True, prefetch_factor=prefetch_factor)
+
+    if batched:
+        if sampler is None:
+            sampler = data.RandomSampler(dataset, generator=generator) if shuffle else data.SequentialSampler(dataset)
+        return data.DataLoader(dataset, sampler=data.BatchSampler(sampler, batch_size, drop_last=False), batch_size=None, **kwargs)
+    return data.DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, sampler=sampler, **kwargs)
+
+
+class DevicePrefetcher(object):
+    """
+        wraps a loader and copies the next batch to device on a side cuda stream while the current batch is used,
+        on cpu devices batches are passed through unchanged.
+    """
+    def __init__(self, loader, device):
+        self.loader = loader
+        self.device = torch.device(device)
+        self.stream = torch.cuda.Stream(self.device) if self.device.type == 'cuda' else None
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        if self.stream is None:
+            for batch in self.loader:
+                yield batch
+            return
+
+        current = torch.cuda.current_stream(self.device)
+        staged = None
+        for batch in self.loader:
+            with torch.cuda.stream(self.stream):
+                batch = [tensor.to(self.device, non_blocking=True) for tensor in batch]
+            if staged is not None:
+                yield staged
+            # the copy must be finished before the batch is used, and its memory kept until the compute stream is done
+            current.wait_stream(self.stream)
+            for tensor in batch:
+                tensor.record_stream(current)
+            staged = batch
+        if staged is not None:
+            yield staged
@@ -0,0 +1,562 @@
+"""
+    MAXL training engine: one parameterised trainer for every dataset / backbone / hierarchy / schedule of the
+    MAXL scripts. configurations run back-to-back in one process share their datasets and loaders through a
+    DataCache, so only the first run pays for reading (and integrity-checking) a dataset and starting loader workers.
+"""
+import argparse
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+import torch
+import torch.optim as optim
+from torch.utils.data import Subset
+import torchvision
+import torchvision.transforms as transforms
+
+from maxl.ops import LabelHierarchy
+from maxl.models import (SimpleCNN, SimpleCNNLabelGenerator, VGG16, VGG16LabelGenerator, ResNet32, ResNetLabelGenerator,
+                         mnist_simple_cnn, mnist_label_generator)
+from maxl.train import train_epoch, evaluate
+from maxl.data import load_packed, packed_svhn, PackedDataset, stratified_subset, BatchTransform, make_loader, DevicePrefetcher
+from maxl.checkpoint import Checkpoint, CheckpointWriter, ResumableSampler
+from maxl.timing import PhaseTimer
+from maxl.profiling import StepProfiler
+from maxl.shards import open_shards
+
+
+#---------------------------------------------------------datasets----------------------------------------------------------------------#
+
+CIFAR_MEAN, CIFAR_STD = (0.5, 0.5, 0.5), (0.2, 0.2, 0.2)
+CINIC_MEAN = [0.47889522, 0.47227842, 0.43047404]
+CINIC_STD = [0.24205776, 0.23828046, 0.25874835]
+
+
+def load_mnist(root, split, packed=False, aug_seed=None):
+    if packed:
+        raise ValueError('mnist has no packed cache')
+    return torchvision.datasets.MNIST(root, train=split == 'train', download=True, transform=transforms.ToTensor()), {}
+
+
+def load_svhn(root, split, packed=False, aug_seed=None):
+    if packed:
+        # whole batches are gathered from the memory-mapped split, ToTensor is applied to the uint8 batch
+        return packed_svhn(root, split, transform=BatchTransform((0, 0, 0), (1, 1, 1))), {'batched': True}
+    return torchvision.datasets.SVHN(root, split=split, download=True, transform=transforms.ToTensor()), {}
+
+
+def load_cifar10(root, split, packed=False, aug_seed=None):
+    train = split == 'train'
+    if packed:
+        def build():
+            # uint8 NCHW images, built once from the pickled batches
+            dataset = torchvision.datasets.CIFAR10(root, train=train, download=True)
+            return dataset.data.transpose(0, 3, 1, 2), dataset.targets
+
+        transform = BatchTransform(CIFAR_MEAN, CIFAR_STD, padding=4 if train else 0, flip=train,
+                                   seed=aug_seed if train else None)
+        # batches are augmented in the main process, so a seeded augmentation is reproducible
+        return (PackedDataset(*load_packed(os.path.join(root, 'cifar10_' + split), build), transform=transform),
+                {'batched': True, 'num_workers': 0})
+
+    augment = [transforms.RandomCrop(32, padding=4), transforms.RandomHorizontalFlip()] if train else []
+    transform = transforms.Compose(augment + [transforms.ToTensor(), transforms.Normalize(CIFAR_MEAN, CIFAR_STD)])
+    return torchvision.datasets.CIFAR10(root, train=train, download=True, transform=transform), {}
+
+
+def load_cinic10(root, split, packed=False, aug_seed=None):
+    if packed:
+        # pre-decoded uint8 shards, converted from the PNG image folder on first use
+        return (open_shards(root + '_shards/' + split, root + '/' + split, transform=BatchTransform(CINIC_MEAN, CINIC_STD)),
+                {'batched': True})
+    transform = transforms.Compose([transforms.ToTensor(), transforms.Normalize(mean=CINIC_MEAN, std=CINIC_STD)])
+    return torchvision.datasets.ImageFolder(root + '/' + split, transform=transform), {}
+
+
+# load(root, split, packed, aug_seed) -> (dataset, make_loader options), default root and image shape of every dataset,
+# all of them have 10 classes
+DATASETS = OrderedDict([
+    ('mnist', (load_mnist, '.', (1, 28, 28))),
+    ('svhn', (load_svhn, '.', (3, 32, 32))),
+    ('cifar10', (load_cifar10, './img_data', (3, 32, 32))),
+    ('cinic10', (load_cinic10, './dataset/cinic10', (3, 32, 32))),
+])
+CLASSES = 10
+# the dedicated validation split of a dataset, if it has one
+VALIDATION_SPLITS = {'cinic10': 'valid'}
+
+
+def dataset_labels(dataset):
+    return dataset.labels if hasattr(dataset, 'labels') else dataset.targets
+
+
+class DataCache(object):
+    """
+        datasets and device loaders shared by the runs of a process, keyed by everything that changes their content.
+        a cached training loader is handed out again with its ResumableSampler reset to the new run's seed
+        (and a seeded batch augmentation to its first batch), so a run sees the same data order alone or in a sweep.
+    """
+    def __init__(self):
+        self.datasets = {}
+        self.loaders = {}
+
+    def dataset(self, name, root, split, packed=False, aug_seed=None):
+        key = (name, root, split, packed, aug_seed)
+        if key not in self.datasets:
+            load = DATASETS[name][0]
+            self.datasets[key] = load(root, split, packed, aug_seed)
+        return self.datasets[key]
+
+    def train_loader(self, name, root, batch_size, device, seed=0, packed=False, aug_seed=None):
+        """
+            (DevicePrefetcher, ResumableSampler) of the training split, the sampler draws its order from seed.
+        """
+        key = (name, root, 'train', packed, aug_seed, batch_size, str(device))
+        if key not in self.loaders:
+            dataset, options = self.dataset(name, root, 'train', packed, aug_seed)
+            sampler = ResumableSampler(dataset, seed=seed)
+            self.loaders[key] = (DevicePrefetcher(make_loader(dataset, batch_size, sampler=sampler, **options), device), sampler)
+        loader, sampler = self.loaders[key]
+        sampler.load_state_dict({'seed': seed, 'passes': 0, 'start': 0})
+        transform = getattr(loader.loader.dataset, 'transform', None)
+        if isinstance(transform, BatchTransform):
+            transform.batch = 0
+        return loader, sampler
+
+    def eval_loader(self, name, root, split, batch_size, device, packed=False, samples=0, seed=0):
+        """
+            DevicePrefetcher of an evaluation split, or of a fixed stratified subset of samples of it
+            (cached as root/<name>_<split>_val_<samples>_<seed>.npy, so every run sees the same subset).
+        """
+        key = (name, root, split, packed, batch_size, str(device), samples, seed)
+        if key not in self.loaders:
+            dataset, options = self.dataset(name, root, split, packed)
+            if samples:
+                path = os.path.join(root, '{}_{}_val_{}_{}.npy'.format(name, split, samples, seed))
+                dataset = Subset(dataset, stratified_subset(dataset_labels(dataset), samples, seed=seed, path=path))
+            self.loaders[key] = DevicePrefetcher(make_loader(dataset, batch_size, shuffle=True, **options), device)
+        return self.loaders[key]
+
+    def clear(self):
+        self.datasets.clear()
+        self.loaders.clear()
+
+
+# the cache of the process, used by run() unless another one is given
+cache = DataCache()
+
+
+#---------------------------------------------------------backbones---------------------------------------------------------------------#
+
+def simple_cnn(psi, shape, aux_hidden=None):
+    # single-channel (MNIST) images use the narrower variant with 128 flattened features
+    if shape[0] == 1:
+        return mnist_simple_cnn(psi, aux_hidden=aux_hidden)
+    return SimpleCNN(psi, aux_hidden=aux_hidden)
+
+
+def simple_cnn_label_generator(psi, shape):
+    if shape[0] == 1:
+        return mnist_label_generator(psi)
+    return SimpleCNNLabelGenerator(psi)
+
+
+# (multi-task network, label generator) builders of every backbone, called with (psi, image shape)
+BACKBONES = OrderedDict([
+    ('simplecnn', (simple_cnn, simple_cnn_label_generator)),
+    # wider auxiliary head (128->64), as used for the SVHN validation runs
+    ('simplecnn-wide', (lambda psi, shape: simple_cnn(psi, shape, aux_hidden=(128, 64)), simple_cnn_label_generator)),
+    ('vgg16', (lambda psi, shape: VGG16(psi), lambda psi, shape: VGG16LabelGenerator(psi))),
+    ('resnet32', (lambda psi, shape: ResNet32(psi), lambda psi, shape: ResNetLabelGenerator(psi))),
+])
+
+
+#---------------------------------------------------------configurations----------------------------------------------------------------#
+
+DEFAULTS = OrderedDict([
+    ('name', 'maxl'),
+    # data
+    ('dataset', 'cifar10'), ('root', None), ('packed', False), ('aug_seed', None), ('batch_size', None),
+    ('validate', None), ('val_samples', 0), ('full_val_every', 0),
+    # task: psi auxiliary classes per primary class, {fine: coarse} hierarchy, primary task on the fine or coarse labels
+    ('backbone', 'vgg16'), ('psi', [3]), ('hierarchy', None), ('primary', 'fine'),
+    # schedule: both networks' learning rates are multiplied by gamma every step_size epochs (at the start of the epoch
+    # with schedule_first, else after training), the meta learning rate every meta_lr_every epochs
+    ('epochs', 200), ('optimizer', 'sgd'), ('lr', 0.01), ('gen_lr', 1e-3), ('gen_weight_decay', 5e-4),
+    ('step_size', 50), ('gamma', 0.5), ('meta_lr', 0.01), ('meta_lr_every', 50), ('schedule_first', True), ('seed', None),
+    # MAXL steps
+    ('single_pass', False), ('meta_grad', 'second-order'), ('cos_every', 0),
+    # outputs
+    ('checkpoint', None), ('checkpoint_every', 0), ('resume', False), ('save', None), ('outf', None), ('keep', 3),
+    ('log', None), ('timing', False), ('memory', False), ('profile', None), ('profile_steps', [5, 2, 3]),
+    ('device', None),
+])
+
+# the configurations of the original training scripts
+PRESETS = OrderedDict([
+    ('mnist', dict(name='mnist', dataset='mnist', backbone='simplecnn',
+                   hierarchy={0: 0, 1: 1, 2: 2, 3: 0, 4: 2, 5: 2, 6: 0, 7: 1, 8: 0, 9: 0},
+                   epochs=30, optimizer='adam', lr=1e-3, step_size=10, meta_lr=1e-3, meta_lr_every=10,
+                   schedule_first=False, seed=7, checkpoint='./checkpoint_mnist_maxl.pth')),
+    ('svhn', dict(name='svhn', dataset='svhn', backbone='simplecnn',
+                  hierarchy={0: 0, 1: 1, 2: 2, 3: 0, 4: 2, 5: 2, 6: 0, 7: 1, 8: 0, 9: 0},
+                  epochs=30, optimizer='adam', lr=1e-3, step_size=10, meta_lr=1e-3, meta_lr_every=10,
+                  schedule_first=False, seed=7, checkpoint='./checkpoint_svhn_maxl.pth')),
+    ('svhn-validation', dict(name='svhn-validation', dataset='svhn', backbone='simplecnn-wide',
+                             hierarchy={0: 0, 1: 1, 2: 2, 3: 0, 4: 2, 5: 2, 6: 0, 7: 1, 8: 0, 9: 0},
+                             validate='extra', val_samples=20000,
+                             epochs=30, optimizer='adam', lr=1e-3, step_size=10, meta_lr=1e-3, meta_lr_every=10,
+                             schedule_first=False, seed=7, checkpoint='./checkpoint_svhn_validation_maxl.pth')),
+    ('cifar10', dict(name='cifar10', dataset='cifar10', backbone='vgg16',
+                     hierarchy={0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 1, 6: 2, 7: 2, 8: 2, 9: 2},
+                     checkpoint='./checkpoint10.pth', save='./model10')),
+    ('cinic10-pri3', dict(name='cinic10-pri3', dataset='cinic10', backbone='resnet32',
+                          hierarchy={0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 1, 6: 2, 7: 2, 8: 2, 9: 2},
+                          epochs=30, meta_lr_every=10, outf='./model/', log='log.txt')),
+    ('cinic10-pri5', dict(name='cinic10-pri5', dataset='cinic10', backbone='resnet32', psi=[5],
+                          hierarchy={0: 0, 1: 1, 2: 2, 3: 2, 4: 3, 5: 2, 6: 3, 7: 4, 8: 0, 9: 1},
+                          epochs=30, meta_lr_every=10, outf='./pri5model/', log='pri5log.txt')),
+])
+
+BATCH_SIZES = {'mnist': 128, 'svhn': 128, 'cifar10': 100, 'cinic10': 128}
+
+
+def parse_hierarchy(hierarchy):
+    """
+        {fine: coarse} dict of a hierarchy given as a dict (json string keys allowed) or a list of coarse labels.
+    """
+    if hierarchy is None:
+        return None
+    if isinstance(hierarchy, (list, tuple)):
+        return {fine: int(coarse) for fine, coarse in enumerate(hierarchy)}
+    return {int(fine): int(coarse) for fine, coarse in hierarchy.items()}
+
+
+def configure(preset=None, **options):
+    """
+        full configuration: DEFAULTS, updated by the preset's options (see PRESETS), updated by options.
+    """
+    unknown = set(options) - set(DEFAULTS)
+    if unknown:
+        raise ValueError('unknown options: {}'.format(', '.join(sorted(unknown))))
+    config = OrderedDict(DEFAULTS)
+    if preset is not None:
+        config.update(PRESETS[preset])
+    config.update(options)
+
+    if config['dataset'] not in DATASETS:
+        raise ValueError('unknown dataset {}'.format(config['dataset']))
+    if config['backbone'] not in BACKBONES:
+        raise ValueError('unknown backbone {}'.format(config['backbone']))
+    config['hierarchy'] = parse_hierarchy(config['hierarchy'])
+    if config['hierarchy'] is not None:
+        if sorted(config['hierarchy']) != list(range(CLASSES)):
+            raise ValueError('the hierarchy must map each of the {} fine labels'.format(CLASSES))
+        coarse = sorted(set(config['hierarchy'].values()))
+        if coarse != list(range(len(coarse))):
+            raise ValueError('the coarse labels of the hierarchy must be 0 .. {}, got {}'.format(len(coarse) - 1, coarse))
+    if config['primary'] == 'coarse' and config['hierarchy'] is None:
+        raise ValueError('a coarse primary task needs a hierarchy')
+    if config['root'] is None:
+        config['root'] = DATASETS[config['dataset']][1]
+    if config['batch_size'] is None:
+        config['batch_size'] = BATCH_SIZES[config['dataset']]
+    if config['checkpoint'] is None:
+        config['checkpoint'] = (os.path.join(config['outf'], 'checkpoint.pth') if config['outf']
+                                else './checkpoint_{}.pth'.format(config['name']))
+    return config
+
+
+def primary_psi(config):
+    """
+        psi of the configuration, a single value is repeated for every primary class.
+    """
+    if config['primary'] == 'coarse':
+        classes = max(config['hierarchy'].values()) + 1
+    else:
+        classes = CLASSES
+    psi = list(config['psi'])
+    if len(psi) == 1:
+        psi = psi * classes
+    if len(psi) != classes:
+        raise ValueError('psi has {} entries for {} primary classes'.format(len(psi), classes))
+    return psi
+
+
+#---------------------------------------------------------training----------------------------------------------------------------------#
+# (the training framework follows the paper author's https://github.com/lorenmt/maxl)
+
+def optimizers(config, model, label_generator):
+    if config['optimizer'] == 'adam':
+        optimizer = optim.Adam(model.parameters(), lr=config['lr'])
+        gen_optimizer = optim.Adam(label_generator.parameters(), lr=config['gen_lr'], weight_decay=config['gen_weight_decay'])
+    elif config['optimizer'] == 'sgd':
+        optimizer = optim.SGD(model.parameters(), lr=config['lr'])
+        gen_optimizer = optim.SGD(label_generator.parameters(), lr=config['gen_lr'], weight_decay=config['gen_weight_decay'])
+    else:
+        raise ValueError('unknown optimizer {}'.format(config['optimizer']))
+    scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=config['step_size'], gamma=config['gamma'])
+    gen_scheduler = optim.lr_scheduler.StepLR(gen_optimizer, step_size=config['step_size'], gamma=config['gamma'])
+    return optimizer, gen_optimizer, scheduler, gen_scheduler
+
+
+def epoch_report(index, k, cost):
+    return ('EPOCH: {:04d} Iter {:04d} | TRAIN [LOSS|ACC.]: PRI {:.4f} {:.4f} COSSIM {:.4f} || '
+            'META [LOSS|ACC.]: PRE {:.4f} {:.4f} AFTER {:.4f} {:.4f} || TEST: {:.4f} {:.4f}'
+            .format(index, k, cost[0], cost[1], cost[2], cost[3], cost[4], cost[5], cost[6], cost[7], cost[8]))
+
+
+def run(config, data_cache=None):
+    """
+        train one configuration (see configure), printing a report line per epoch. returns avg_cost, the
+        (epochs, 9) training / meta-training / evaluation metrics of every epoch.
+    """
+    data_cache = data_cache or cache
+    device = torch.device(config['device'] or ('cuda:0' if torch.cuda.is_available() else 'cpu'))
+    name, root, packed, batch_size = config['dataset'], config['root'], config['packed'], config['batch_size']
+    shape = DATASETS[name][2]
+    seed = config['seed']
+    if seed is not None:
+        torch.manual_seed(seed)
+        torch.cuda.manual_seed(seed)
+    torch.backends.cudnn.deterministic = seed is not None
+    # without a seed every run draws its own training order (saved with the sampler, so a resumed run keeps it),
+    # while the validation subset stays the fixed one of seed 0
+    data_seed = seed if seed is not None else 0
+    order_seed = seed if seed is not None else int(torch.randint(2 ** 31, ()))
+
+    train_loader, train_sampler = data_cache.train_loader(name, root, batch_size, device, order_seed, packed, config['aug_seed'])
+    test_loader = data_cache.eval_loader(name, root, 'test', batch_size, device, packed)
+    if config['validate'] is None:
+        val_loader = full_val_loader = test_loader
+    else:
+        full_val_loader = data_cache.eval_loader(name, root, config['validate'], batch_size, device, packed)
+        val_loader = data_cache.eval_loader(name, root, config['validate'], batch_size, device, packed,
+                                            config['val_samples'], data_seed)
+    # the best per-epoch model is chosen by validation accuracy: that of the evaluated split when validating,
+    # else that of the dataset's validation split (evaluated for it alone), no best is kept without one
+    select_loader = None
+    if config['outf'] and config['validate'] is None and name in VALIDATION_SPLITS:
+        select_loader = data_cache.eval_loader(name, root, VALIDATION_SPLITS[name], batch_size, device, packed)
+
+    # the networks are initialised from the seed whether or not the data came from the cache
+    if seed is not None:
+        torch.manual_seed(seed)
+    psi = primary_psi(config)
+    build_model, build_generator = BACKBONES[config['backbone']]
+    label_generator = build_generator(psi, shape).to(device)
+    model = build_model(psi, shape).to(device)
+    optimizer, gen_optimizer, scheduler, gen_scheduler = optimizers(config, model, label_generator)
+
+    # fine primary labels are the loaded labels themselves, only a coarse primary task looks the hierarchy up
+    hierarchy = LabelHierarchy(config['hierarchy']) if config['primary'] == 'coarse' else None
+
+    def prepare(data, label):
+        # move a batch to the device and pick the primary labels
+        data, label = data.to(device), label.to(device)
+        return data, label if hierarchy is None else hierarchy.coarse(label)
+
+    epochs = config['epochs']
+    avg_cost = np.zeros([epochs, 9], dtype=np.float32)
+    lr = config['meta_lr']  # learning rate for second-derivative step (theta_1^+)
+    k = 0
+    train_batch = len(train_loader)
+
+    # per-phase wall time (and peak memory) of the training steps, reported after every epoch
+    timer = PhaseTimer(device, memory=config['memory']) if config['timing'] or config['memory'] else None
+    # opt-in torch.profiler window over the first training steps
+    profiler = StepProfiler(config['profile'], *config['profile_steps']) if config['profile'] else None
+
+    # full training state, progress is the epoch state of a checkpoint saved mid-epoch,
+    # checkpoints are written atomically on a background thread
+    writer = CheckpointWriter(keep=config['keep'])
+    checkpoint = Checkpoint(config['checkpoint'], every=config['checkpoint_every'], writer=writer, model=model,
+                            label_generator=label_generator, optimizer=optimizer, gen_optimizer=gen_optimizer,
+                            scheduler=scheduler, gen_scheduler=gen_scheduler, train_sampler=train_sampler)
+    start_epoch, progress = 0, None
+    if config['resume']:
+        progress, values = checkpoint.load()
+        start_epoch, lr, k, avg_cost = values['epoch'], values['lr'], values['k'], values['avg_cost']
+        # the per-epoch models saved before the interruption stay under retention (and the best one is remembered)
+        writer.load_state_dict(values['writer'])
+        transform = getattr(train_loader.loader.dataset, 'transform', None)
+        if isinstance(transform, BatchTransform):
+            # the b-th augmented batch of a run is drawn from aug_seed + b, so b follows from the restored sampler
+            # position (the live counter runs ahead of training by the batches the loader has prefetched,
+            # so it is not saved itself)
+            transform.batch = train_sampler.batches(batch_size)
+
+    log = open(config['log'], 'a' if config['resume'] else 'w') if config['log'] else None
+    try:
+        for index in range(start_epoch, epochs):
+            # drop the learning rates, the meta learning rate with the same strategy as the multi-task network's
+            # (a run resumed mid-epoch has already done so for this epoch)
+            if progress is None:
+                if (index + 1) % config['meta_lr_every'] == 0:
+                    lr = lr * config['gamma']
+                if config['schedule_first']:
+                    scheduler.step()
+                    gen_scheduler.step()
+
+            # training data (training-step, update on theta_1 and meta-training step, update on theta_2)
+            model.train()
+            avg_cost[index][0:7] = train_epoch(model, label_generator, optimizer, gen_optimizer, train_loader, prepare, lr,
+                                               single_pass=config['single_pass'], meta_grad=config['meta_grad'],
+                                               cos_every=config['cos_every'],
+                                               on_batch=lambda state: checkpoint.step(state, epoch=index, lr=lr, k=k,
+                                                                                      avg_cost=avg_cost,
+                                                                                      writer=writer.state_dict()),
+                                               resume=progress, timer=timer, profiler=profiler)
+            progress = None
+            k = k + train_batch
+
+            if not config['schedule_first']:
+                scheduler.step()
+                gen_scheduler.step()
+
+            # evaluate on the test (or validation) data, the full validation split only every full_val_every epochs
+            model.eval()
+            full_val = config['full_val_every'] and (index + 1) % config['full_val_every'] == 0
+            avg_cost[index][7:] = evaluate(model, full_val_loader if full_val else val_loader, prepare)
+
+            if config['save']:
+                writer.save(config['save'], model.state_dict())
+            if config['outf']:
+                if config['validate'] is not None:
+                    score = avg_cost[index][8]
+                else:
+                    score = evaluate(model, select_loader, prepare)[1] if select_loader is not None else None
+                writer.save('%s/net_%03d.pth' % (config['outf'], index + 1), model.state_dict(), series='net',
+                            score=score)
+            report = epoch_report(index, k, avg_cost[index])
+            print(report)
+            if log is not None:
+                log.write(report + '\n')
+                log.flush()
+            if timer is not None:
+                print('TIMING: ' + timer.report())
+                timer.reset()
+            checkpoint.save(epoch=index + 1, lr=lr, k=k, avg_cost=avg_cost, writer=writer.state_dict())
+    finally:
+        if profiler is not None:
+            profiler.close()
+        if log is not None:
+            log.close()
+        writer.close()
+
+    if config['validate'] is not None:
+        # evaluate on test data
+        model.eval()
+        test_cost = evaluate(model, test_loader, prepare)
+        print('TEST [LOSS|ACC.]: {:.4f} {:.4f}'.format(test_cost[0], test_cost[1]))
+    return avg_cost
+
+
+#---------------------------------------------------------command line------------------------------------------------------------------#
+
+def parser():
+    # only the options given on the command line are set, the rest comes from the preset and DEFAULTS
+    parser = argparse.ArgumentParser(description='MAXL training', argument_default=argparse.SUPPRESS)
+    parser.add_argument('--preset', default=None, choices=list(PRESETS),
+                        help='configuration of one of the original training scripts, updated by the other options')
+    parser.add_argument('--sweep', default=None, metavar='FILE',
+                        help='json list of option dicts (each may name its own "preset"), run one after the other in '
+                             'this process on top of the command line configuration, sharing datasets and loaders '
+                             '(give every run its own --checkpoint or --outf)')
+    parser.add_argument('--name', help='run name, checkpoints go to ./checkpoint_NAME.pth unless --checkpoint/--outf is set')
+
+    parser.add_argument('--dataset', choices=list(DATASETS))
+    parser.add_argument('--root', help='dataset directory (the dataset\'s usual location by default)')
+    parser.add_argument('--packed', '--shards', dest='packed', action='store_true',
+                        help='serve whole batches from a packed uint8 cache (pre-decoded shards for CINIC-10) '
+                             'instead of decoding every image')
+    parser.add_argument('--aug-seed', type=int,
+                        help='seed the batched crop/flip augmentation of --packed for reproducible (and exactly resumable) '
+                             'runs, the torchvision augmentation without --packed draws from the loader workers\' rng '
+                             'and is not reproduced by --resume')
+    parser.add_argument('--batch-size', type=int)
+    parser.add_argument('--validate', metavar='SPLIT',
+                        help='evaluate every epoch on this split (e.g. svhn extra, cinic10 valid) and on test at the end')
+    parser.add_argument('--val-samples', type=int,
+                        help='validate on a fixed stratified subset of N samples of the split (0 for the full split)')
+    parser.add_argument('--full-val-every', type=int,
+                        help='validate on the full split every K epochs')
+
+    parser.add_argument('--backbone', choices=list(BACKBONES))
+    parser.add_argument('--psi', type=int, nargs='+',
+                        help='auxiliary classes of every primary class, a single value is used for all of them')
+    parser.add_argument('--hierarchy', type=json.loads,
+                        help='json {fine: coarse} dict, or list of coarse labels indexed by the fine label')
+    parser.add_argument('--primary', choices=['fine', 'coarse'],
+                        help='train the primary task on the fine labels or on their coarse hierarchy level')
+
+    parser.add_argument('--epochs', type=int)
+    parser.add_argument('--optimizer', choices=['sgd', 'adam'])
+    parser.add_argument('--lr', type=float, help='learning rate of the multi-task network')
+    parser.add_argument('--gen-lr', type=float, help='learning rate of the label generator')
+    parser.add_argument('--gen-weight-decay', type=float)
+    parser.add_argument('--step-size', type=int, help='multiply both learning rates by gamma every N epochs')
+    parser.add_argument('--gamma', type=float)
+    parser.add_argument('--meta-lr', type=float, help='learning rate of the second-derivative step (theta_1^+)')
+    parser.add_argument('--meta-lr-every', type=int, help='multiply the meta learning rate by gamma every N epochs')
+    parser.add_argument('--schedule-first', type=json.loads, metavar='{true,false}',
+                        help='step the learning rate schedulers at the start of every epoch (else after training)')
+    parser.add_argument('--seed', type=int,
+                        help='seed the networks and the data order (cudnn is made deterministic), '
+                             'without it every run draws its own data order')
+
+    parser.add_argument('--single-pass', action='store_true',
+                        help='drive the training and meta-training steps from every mini-batch of a single pass over the data')
+    parser.add_argument('--meta-grad', choices=['second-order', 'finite-difference'],
+                        help='exact second-order meta-gradient or its first-order finite-difference estimate')
+    parser.add_argument('--cos-every', type=int,
+                        help='also probe the gradient cosine similarity every N training batches (first batch only by default)')
+
+    parser.add_argument('--checkpoint',
+                        help='file holding the full training state (networks, optimisers, schedulers, rng, data order, log)')
+    parser.add_argument('--checkpoint-every', type=int,
+                        help='also save the training state every N training batches (only at epoch ends by default)')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume from --checkpoint, at the batch boundary it was saved at')
+    parser.add_argument('--save', metavar='FILE', help='save the multi-task network to FILE after every epoch')
+    parser.add_argument('--outf', help='folder for the per-epoch models net_NNN.pth (and the checkpoint)')
+    parser.add_argument('--keep', type=int,
+                        help='keep the last K >= 1 per-epoch models (plus the best validation accuracy one, '
+                             'if there is a validation split)')
+    parser.add_argument('--log', metavar='FILE', help='also write the epoch reports to FILE')
+    parser.add_argument('--timing', action='store_true',
+                        help='report the wall time and samples/sec of every training phase per epoch '
+                             '(synchronises the device at every phase boundary)')
+    parser.add_argument('--memory', action='store_true',
+                        help='also report the peak memory of every training phase per epoch '
+                             '(process rss, cuda allocator peaks, bytes saved for backward)')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='run torch.profiler over a window of training steps, writing a chrome trace and operator tables to DIR')
+    parser.add_argument('--profile-steps', type=int, nargs=3, metavar=('WAIT', 'WARMUP', 'ACTIVE'),
+                        help='profiler window: skip WAIT steps, trace WARMUP steps without recording, record ACTIVE steps')
+    parser.add_argument('--device', help='cuda:0 if available, else cpu')
+    return parser
+
+
+def main(argv=None):
+    options = vars(parser().parse_args(argv))
+    preset, sweep = options.pop('preset'), options.pop('sweep')
+    if sweep is None:
+        runs = [{}]
+    else:
+        with open(sweep) as f:
+            runs = json.load(f)
+
+    for overrides in runs:
+        overrides = dict(overrides)
+        config = configure(overrides.pop('preset', preset), **dict(options, **overrides))
+        if sweep is not None:
+            print('RUN: ' + json.dumps(config))
+        run(config)
+
+
+if __name__ == '__main__':
+    # python -m maxl.engine --preset cinic10-pri5 --shards --epochs 10
+    # python -m maxl.engine --dataset svhn --backbone simplecnn --psi 5 --sweep sweep.json
+    main()
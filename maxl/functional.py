@@ -0,0 +1,36 @@
+import weakref
+
+import torch.nn as nn
+from torch.func import functional_call
+
+# per-module batch-norm buffer substitutions, built once
+_batch_norm_buffers = weakref.WeakKeyDictionary()
+
+
+def batch_norm_buffers(module):
+    """
+        None for the running statistics of every batch-norm layer of module, so a substituted forward normalises
+        with batch statistics (in train and eval mode) and neither reads nor updates the module's own buffers.
+        built once per module, no tensor is allocated or reset.
+    """
+    buffers = _batch_norm_buffers.get(module)
+    if buffers is None:
+        buffers = {}
+        for name, layer in module.named_modules():
+            if isinstance(layer, nn.modules.batchnorm._BatchNorm) and layer.track_running_stats:
+                prefix = name + '.' if name else ''
+                for buffer in ('running_mean', 'running_var', 'num_batches_tracked'):
+                    buffers[prefix + buffer] = None
+        _batch_norm_buffers[module] = buffers
+    return buffers
+
+
+def functional_forward(module, weights, *args):
+    """
+        run the module's own forward with its parameters replaced by weights (e.g. theta_1^+ in the second-derivative
+        step), so the meta step always evaluates exactly the network used in the training step.
+        batch norm always normalises with batch statistics (see batch_norm_buffers), the module's own are left unchanged.
+    """
+    tensors = dict(weights)
+    tensors.update(batch_norm_buffers(module))
+    return functional_call(module, tensors, args)
@@ -0,0 +1,40 @@
+import numpy as np
+import torch
+
+
+class MetricSums(object):
+    """
+        running sums of metric columns, kept as one tensor on the device of the first added value,
+        so steps never synchronise with the host. every add() also counts how many samples (or steps) its values
+        cover, the counts live on the host and mean() copies the sums back once (e.g. at epoch end) and divides
+        each column by its own count, so ragged last batches are weighted exactly.
+    """
+    def __init__(self, size):
+        self.sums = None
+        self.counts = np.zeros(size)
+
+    def add(self, column, *values, count=1):
+        """
+            add values (tensors or numbers, summed over count samples) to the columns starting at column.
+        """
+        device = next((value.device for value in values if torch.is_tensor(value)), None)
+        if self.sums is None:
+            self.sums = torch.zeros(len(self.counts), device=device)
+        elif device is not None and self.sums.device != device:
+            # e.g. sums restored from a checkpoint on the cpu
+            self.sums = self.sums.to(device)
+        for i, value in enumerate(values, column):
+            self.sums[i].add_(value.detach() if torch.is_tensor(value) else value)
+        self.counts[column:column + len(values)] += count
+
+    def mean(self):
+        sums = np.zeros(len(self.counts)) if self.sums is None else self.sums.cpu().numpy()
+        return (sums / np.maximum(self.counts, 1)).astype(np.float32)
+
+    def state_dict(self):
+        # references to the running sums, saved as they are at this step
+        return {'sums': self.sums, 'counts': self.counts}
+
+    def load_state_dict(self, state):
+        self.sums = None if state['sums'] is None else state['sums'].clone()
+        self.counts = state['counts'].copy()
@@ -0,0 +1,139 @@
+import argparse
+import json
+from collections import OrderedDict
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils import benchmark
+
+from maxl.ops import psi_mask, psi_groups, grouped_softmax, focal_loss, soft_focal_loss, LabelHierarchy
+from maxl.models import LabelGenerator, MultiTaskNetwork
+
+
+# auxiliary-class hierarchies: psi[i] auxiliary classes for primary class i
+PSI = OrderedDict([
+    ('uniform3', [3] * 10),
+    ('uniform5', [5] * 10),
+    ('large', [20] * 100),
+    ('ragged', [2, 5, 3, 8, 1, 4, 6, 2, 7, 3]),
+])
+
+
+#---------------------------------------------------------reference implementations of the original scripts-----------------------------#
+
+def legacy_class_generator(mapping):
+    # per-element dict lookups through np.vectorize, on cpu labels
+    def generate(label):
+        label_c = np.vectorize(mapping.get)(label)
+        label_c = torch.tensor(label_c, dtype=torch.int64)
+        return torch.cat((label_c.view(label_c.shape[0], -1), label.view(label.shape[0], -1)), 1)
+    return generate
+
+
+def legacy_mask(psi, y):
+    # build a binary mask by psi on every forward, we add epsilon=1e-8 to avoid nans
+    index = torch.zeros([len(psi), np.sum(psi)]) + 1e-8
+    for i in range(len(psi)):
+        index[i, int(np.sum(psi[:i])):np.sum(psi[:i+1])] = 1
+    return index[y.cpu()].to(y.device)
+
+
+def legacy_label_softmax(x, y, psi):
+    mask = legacy_mask(psi, y)
+    return torch.exp(x) * mask / torch.sum(torch.exp(x) * mask, dim=1, keepdim=True)
+
+
+def legacy_model_fit(x_pred, x_output, pri=True):
+    # focal loss on probabilities (the original networks ended in a softmax), with a one-hot primary target
+    x_pred = F.softmax(x_pred, dim=1)
+    if not pri:
+        x_output_onehot = x_output
+    else:
+        x_output_onehot = torch.zeros(x_pred.shape, device=x_pred.device)
+        x_output_onehot.scatter_(1, x_output.unsqueeze(1), 1)
+
+    loss = x_output_onehot * (1 - x_pred)**2 * torch.log(x_pred + 1e-20)
+    return torch.sum(-loss, dim=1)
+
+
+#---------------------------------------------------------cases-------------------------------------------------------------------------#
+
+def cases(psi, batch_size, device):
+    """
+        (function, implementation, callable, arguments) of every benchmarked function for one psi and batch size,
+        on random logits and labels.
+    """
+    generator = LabelGenerator(psi).to(device)
+    network = MultiTaskNetwork()
+    classes = len(psi)
+    mapping = {i: i % 3 for i in range(classes)}
+
+    label = torch.randint(classes, (batch_size,), device=device)
+    logits = torch.randn(batch_size, classes, device=device)
+    aux_logits = torch.randn(batch_size, int(np.sum(psi)), device=device)
+    aux_target = grouped_softmax(torch.randn_like(aux_logits), label, generator.psi_groups)
+    hierarchy = LabelHierarchy(mapping)
+    groups = psi_groups(psi).to(device)
+    mask = psi_mask(psi).to(device)
+
+    return [
+        ('ClassGenerator', 'legacy np.vectorize', legacy_class_generator(mapping), (label.cpu(),)),
+        ('ClassGenerator', 'LabelHierarchy', hierarchy, (label,)),
+        ('psi mask', 'legacy loop', legacy_mask, (psi, label)),
+        ('psi mask', 'cached buffer', lambda y: mask[y], (label,)),
+        ('label softmax', 'legacy mask loop', legacy_label_softmax, (aux_logits, label, psi)),
+        ('label softmax', 'mask_softmax', lambda x, y: generator.mask_softmax(x, mask[y]), (aux_logits, label)),
+        ('label softmax', 'grouped_softmax', grouped_softmax, (aux_logits, label, groups)),
+        ('model_fit pri', 'legacy one-hot', legacy_model_fit, (logits, label)),
+        ('model_fit pri', 'focal_loss', focal_loss, (logits, label)),
+        ('model_fit aux', 'legacy probabilities', lambda x, t: legacy_model_fit(x, t, pri=False), (aux_logits, aux_target)),
+        ('model_fit aux', 'soft_focal_loss', soft_focal_loss, (aux_logits, aux_target)),
+        ('model_entropy', 'model_entropy', network.model_entropy, (aux_target,)),
+    ]
+
+
+def run(psi_names, batch_sizes, device=None, min_run_time=0.2):
+    """
+        time every case with torch.utils.benchmark: repeated blocks of runs until min_run_time has passed
+        (cuda is synchronised around every block), reporting the median and interquartile range per call.
+        returns the measurements and the result records.
+    """
+    device = torch.device(device or ('cuda:0' if torch.cuda.is_available() else 'cpu'))
+    measurements, records = [], []
+    for name in psi_names:
+        for batch_size in batch_sizes:
+            for function, implementation, fn, args in cases(PSI[name], batch_size, device):
+                timer = benchmark.Timer(stmt='fn(*args)', globals={'fn': fn, 'args': args}, label=function,
+                                        sub_label='{} b={}'.format(name, batch_size), description=implementation,
+                                        num_threads=torch.get_num_threads())
+                measurement = timer.blocked_autorange(min_run_time=min_run_time)
+                measurements.append(measurement)
+                records.append(OrderedDict([('function', function), ('implementation', implementation), ('psi', name),
+                                            ('batch_size', batch_size), ('median_us', measurement.median * 1e6),
+                                            ('iqr_us', measurement.iqr * 1e6), ('blocks', len(measurement.times)),
+                                            ('runs_per_block', measurement.number_per_run)]))
+    return measurements, records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='micro-benchmarks of the label-hierarchy and loss functions')
+    parser.add_argument('--psi', nargs='+', default=list(PSI), choices=list(PSI))
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[32, 128, 512])
+    parser.add_argument('--device', default=None, help='cuda:0 if available, else cpu')
+    parser.add_argument('--min-run-time', type=float, default=0.2, help='seconds of repeated runs per measurement')
+    parser.add_argument('--output', default=None, help='also write the results as json to this file')
+    args = parser.parse_args(argv)
+
+    measurements, records = run(args.psi, args.batch_sizes, args.device, args.min_run_time)
+    compare = benchmark.Compare(measurements)
+    compare.trim_significant_figures()
+    compare.print()
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'arguments': vars(args), 'torch': torch.__version__, 'results': records}, f, indent=2)
+
+
+if __name__ == '__main__':
+    # python -m maxl.microbench --psi uniform3 large --batch-sizes 128 --output micro.json
+    main()
@@ -0,0 +1,400 @@
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from maxl.ops import psi_mask, psi_groups, grouped_softmax, focal_loss, soft_focal_loss
+from maxl.functional import functional_forward
+
+
+# from this many auxiliary classes on, the grouped softmax is the faster one: below, gathering the groups costs more
+# than the dense masked softmax saves (forward + backward at batch 128 on cpu: about even at sum(psi) = 30 and 100,
+# 1.4x faster at 120, 1.9x at 150, 6x at 2000)
+GROUPED_MIN_CLASSES = 120
+
+
+class LabelGenerator(nn.Module):
+    """
+        base of the label-generation networks:
+        takes the input and generates auxiliary labels with masked softmax for an auxiliary task.
+        grouped=True evaluates the softmax on the psi[y] auxiliary classes of each sample only,
+        grouped=False keeps the original epsilon-masked softmax over all sum(psi) classes,
+        grouped=None (default) picks the grouped softmax from GROUPED_MIN_CLASSES auxiliary classes on.
+    """
+    def __init__(self, psi, grouped=None):
+        super(LabelGenerator, self).__init__()
+        self.class_nb = psi
+        self.grouped = int(np.sum(psi)) >= GROUPED_MIN_CLASSES if grouped is None else grouped
+
+        # build the binary mask and the column table by psi once, stored as buffers so they follow the model's device
+        self.register_buffer('psi_mask', psi_mask(psi), persistent=False)
+        self.register_buffer('psi_groups', psi_groups(psi), persistent=False)
+
+    # define masked softmax
+    def mask_softmax(self, x, mask, dim=1):
+        logits = torch.exp(x) * mask / torch.sum(torch.exp(x) * mask, dim=dim, keepdim=True)
+        return logits
+
+    def label_softmax(self, predict, y):
+        if self.grouped:
+            # softmax over the auxiliary classes of each sample's primary class only
+            return grouped_softmax(predict, y, self.psi_groups)
+        # gather the binary mask of each sample's primary class (built once in __init__)
+        mask = self.psi_mask[y]
+        return self.mask_softmax(predict, mask, dim=1)
+
+
+class MultiTaskNetwork(nn.Module):
+    """
+        base of the multi-task networks:
+        takes the input and predicts primary and auxiliary labels (same network structure as in human).
+        forward(x, weights) runs the same network with the given weights, retaining the computational graph
+        which will be used in second-derivative step.
+    """
+    def forward(self, x, weights=None):
+        """
+            if no weights given, use the direct training strategy and update network paramters
+            else run the same network with the given weights, retaining the computational graph
+            which will be used in second-derivative step
+        """
+        if weights is not None:
+            return functional_forward(self, weights, x)
+        return self.predict(x)
+
+    def model_fit(self, x_pred, x_output, pri=True):
+        if not pri:
+            # generated auxiliary label is a soft-assignment vector (no need to change into one-hot vector)
+            return soft_focal_loss(x_pred, x_output)
+        else:
+            # apply focal loss on the target column only (no one-hot vector needed)
+            return focal_loss(x_pred, x_output)
+
+    def model_entropy(self, x_pred1):
+        # compute entropy loss
+        x_pred1 = torch.mean(x_pred1, dim=0)
+        loss1 = x_pred1 * torch.log(x_pred1 + 1e-20)
+        return torch.sum(loss1)
+
+
+#---------------------------------------------------------SimpleCNN (MNIST, SVHN)--------------------------------------------------------#
+# four conv blocks, features is the flattened size of the last block (512 for 32x32 inputs, 128 for 28x28 ones)
+# and hidden the widths of the two hidden fc-layers of the heads
+
+def simple_conv_layer(in_channel, out_channel):
+    conv_block = nn.Sequential(
+        nn.Conv2d(in_channels=in_channel, out_channels=out_channel, kernel_size=3, padding=1),
+        nn.ReLU(),
+        nn.MaxPool2d((2,2))
+        )
+    return conv_block
+
+
+def simple_classifier(features, hidden, out):
+    return nn.Sequential(
+        nn.Linear(features, hidden[0]),
+        nn.ReLU(),
+        nn.Linear(hidden[0], hidden[1]),
+        nn.ReLU(),
+        nn.Linear(hidden[1], out),
+    )
+
+
+def xavier_uniform_init(model):
+    # apply weight initialisation
+    for m in model.modules():
+        if isinstance(m, nn.Conv2d):
+            nn.init.xavier_uniform_(m.weight)
+            nn.init.constant_(m.bias, 0)
+        elif isinstance(m, nn.Linear):
+            nn.init.xavier_uniform_(m.weight)
+            nn.init.constant_(m.bias, 0)
+
+
+class SimpleCNNLabelGenerator(LabelGenerator):
+    def __init__(self, psi, grouped=None, in_channels=3, features=512, hidden=(128, 32)):
+        super(SimpleCNNLabelGenerator, self).__init__(psi, grouped)
+        filter = [32, 32, 64, 128]
+
+        self.block1 = simple_conv_layer(in_channels, filter[0])
+        self.block2 = simple_conv_layer(filter[0], filter[1])
+        self.block3 = simple_conv_layer(filter[1], filter[2])
+        self.block4 = simple_conv_layer(filter[2], filter[3])
+
+        self.classifier = simple_classifier(features, hidden, int(np.sum(self.class_nb)))
+        xavier_uniform_init(self)
+
+    def forward(self, x, y):
+        out = self.block1(x)
+        out = self.block2(out)
+        out = self.block3(out)
+        out = self.block4(out)
+        out = F.dropout(out, 0.2, training=self.training)
+        out = out.view(out.shape[0], -1)
+        out = self.classifier(out)
+        return self.label_softmax(out, y)
+
+
+class SimpleCNN(MultiTaskNetwork):
+    """
+        aux_hidden sets different hidden widths for the auxiliary head (the same as the primary one by default).
+    """
+    def __init__(self, psi, in_channels=3, features=512, hidden=(128, 32), aux_hidden=None):
+        super(SimpleCNN, self).__init__()
+        filter = [32, 32, 64, 128]
+
+        self.block1 = simple_conv_layer(in_channels, filter[0])
+        self.block2 = simple_conv_layer(filter[0], filter[1])
+        self.block3 = simple_conv_layer(filter[1], filter[2])
+        self.block4 = simple_conv_layer(filter[2], filter[3])
+
+        # primary task prediction
+        self.classifier1 = simple_classifier(features, hidden, len(psi))
+        # auxiliary task prediction
+        self.classifier2 = simple_classifier(features, aux_hidden or hidden, int(np.sum(psi)))
+        xavier_uniform_init(self)
+
+    def predict(self, x):
+        out = self.block1(x)
+        out = self.block2(out)
+        out = self.block3(out)
+        out = self.block4(out)
+        out = F.dropout(out, 0.2, training=self.training)
+        out = out.view(out.shape[0], -1)
+        t1_pred = self.classifier1(out)
+        t2_pred = self.classifier2(out)
+
+        return t1_pred, t2_pred
+
+
+def mnist_simple_cnn(psi, aux_hidden=None):
+    # MNIST variant: single-channel 28x28 inputs, narrower fc-layers
+    return SimpleCNN(psi, in_channels=1, features=128, hidden=(64, 32), aux_hidden=aux_hidden)
+
+
+def mnist_label_generator(psi):
+    return SimpleCNNLabelGenerator(psi, in_channels=1, features=128, hidden=(64, 32))
+
+
+#---------------------------------------------------------VGG16 (CIFAR-10)---------------------------------------------------------------#
+
+def vgg_conv_layer(in_channel, out_channel, index):
+    if index < 3:
+        conv_block = nn.Sequential(
+            nn.Conv2d(in_channels=in_channel, out_channels=out_channel, kernel_size=3, padding=1),
+            nn.BatchNorm2d(out_channel),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(in_channels=out_channel, out_channels=out_channel, kernel_size=3, padding=1),
+            nn.BatchNorm2d(out_channel),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(kernel_size=2, stride=2),
+        )
+    else:
+        conv_block = nn.Sequential(
+            nn.Conv2d(in_channels=in_channel, out_channels=out_channel, kernel_size=3, padding=1),
+            nn.BatchNorm2d(out_channel),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(in_channels=out_channel, out_channels=out_channel, kernel_size=3, padding=1),
+            nn.BatchNorm2d(out_channel),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(in_channels=out_channel, out_channels=out_channel, kernel_size=3, padding=1),
+            nn.BatchNorm2d(out_channel),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(kernel_size=2, stride=2),
+        )
+    return conv_block
+
+
+def batch_norm_init(model, init):
+    # apply weight initialisation, init is the xavier variant of the conv and fc weights
+    for m in model.modules():
+        if isinstance(m, nn.Conv2d):
+            init(m.weight)
+            if m.bias is not None:
+                nn.init.constant_(m.bias, 0)
+        elif isinstance(m, nn.BatchNorm2d):
+            nn.init.constant_(m.weight, 1)
+            nn.init.constant_(m.bias, 0)
+        elif isinstance(m, nn.Linear):
+            init(m.weight)
+            nn.init.constant_(m.bias, 0)
+
+
+class VGG16LabelGenerator(LabelGenerator):
+    def __init__(self, psi, grouped=None):
+        super(VGG16LabelGenerator, self).__init__(psi, grouped)
+        filter = [64, 128, 256, 512, 512]
+
+        # define convolution block in VGG-16
+        self.block1 = vgg_conv_layer(3, filter[0], 1)
+        self.block2 = vgg_conv_layer(filter[0], filter[1], 2)
+        self.block3 = vgg_conv_layer(filter[1], filter[2], 3)
+        self.block4 = vgg_conv_layer(filter[2], filter[3], 4)
+        self.block5 = vgg_conv_layer(filter[3], filter[4], 5)
+
+        # define fc-layers in VGG-16 (output auxiliary classes \sum_i\psi[i])
+        self.classifier = nn.Sequential(
+            nn.Linear(filter[-1], filter[-1]),
+            nn.ReLU(inplace=True),
+            nn.Linear(filter[-1], int(np.sum(self.class_nb))),
+        )
+        batch_norm_init(self, nn.init.xavier_normal_)
+
+    def forward(self, x, y):
+        g_block1 = self.block1(x)
+        g_block2 = self.block2(g_block1)
+        g_block3 = self.block3(g_block2)
+        g_block4 = self.block4(g_block3)
+        g_block5 = self.block5(g_block4)
+
+        predict = self.classifier(g_block5.view(g_block5.size(0), -1))
+        return self.label_softmax(predict, y)
+
+
+class VGG16(MultiTaskNetwork):
+    def __init__(self, psi):
+        super(VGG16, self).__init__()
+        filter = [64, 128, 256, 512, 512]
+
+        # define convolution block in VGG-16
+        self.block1 = vgg_conv_layer(3, filter[0], 1)
+        self.block2 = vgg_conv_layer(filter[0], filter[1], 2)
+        self.block3 = vgg_conv_layer(filter[1], filter[2], 3)
+        self.block4 = vgg_conv_layer(filter[2], filter[3], 4)
+        self.block5 = vgg_conv_layer(filter[3], filter[4], 5)
+
+        # primary task prediction
+        self.classifier1 = nn.Sequential(
+            nn.Linear(filter[-1], filter[-1]),
+            nn.ReLU(inplace=True),
+            nn.Linear(filter[-1], len(psi)),
+        )
+
+        # auxiliary task prediction
+        self.classifier2 = nn.Sequential(
+            nn.Linear(filter[-1], filter[-1]),
+            nn.ReLU(inplace=True),
+            nn.Linear(filter[-1], int(np.sum(psi))),
+        )
+        batch_norm_init(self, nn.init.xavier_uniform_)
+
+    def predict(self, x):
+        g_block1 = self.block1(x)
+        g_block2 = self.block2(g_block1)
+        g_block3 = self.block3(g_block2)
+        g_block4 = self.block4(g_block3)
+        g_block5 = self.block5(g_block4)
+
+        t1_pred = self.classifier1(g_block5.view(g_block5.size(0), -1))
+        t2_pred = self.classifier2(g_block5.view(g_block5.size(0), -1))
+
+        return t1_pred, t2_pred
+
+
+#---------------------------------------------------------ResNet-32 (CINIC-10)-----------------------------------------------------------#
+
+class ResidualBlock(nn.Module):
+    def __init__(self, inchannel, outchannel, stride=1):
+        super(ResidualBlock, self).__init__()
+        self.left = nn.Sequential(
+            nn.Conv2d(inchannel, outchannel, kernel_size=3, stride=stride, padding=1, bias=False),
+            nn.BatchNorm2d(outchannel),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(outchannel, outchannel, kernel_size=3, stride=1, padding=1, bias=False),
+            nn.BatchNorm2d(outchannel)
+        )
+        self.shortcut = nn.Sequential()
+        if stride != 1 or inchannel != outchannel:
+            self.shortcut = nn.Sequential(
+                nn.Conv2d(inchannel, outchannel, kernel_size=1, stride=stride, bias=False),
+                nn.BatchNorm2d(outchannel)
+            )
+
+    def forward(self, x):
+        out = self.left(x)
+        out += self.shortcut(x)
+        out = F.relu(out)
+        return out
+
+
+class ResNetTrunk(object):
+    """
+        convolution part of ResNet-32 (shared by the multi-task network and its label generator),
+        features() gives the average-pooled 256-channel output.
+    """
+    def build_trunk(self, block):
+        self.inchannel = 64
+        self.conv1 = nn.Sequential(
+            nn.Conv2d(3, 64, kernel_size=3, stride=1, padding=1, bias=False),
+            nn.BatchNorm2d(64),
+            nn.ReLU(),
+        )
+        self.layer1 = self.make_layer(block, 64, 5, stride=1)
+        self.layer2 = self.make_layer(block, 128, 5, stride=2)
+        self.layer3 = self.make_layer(block, 256, 4, stride=2)
+
+    def make_layer(self, block, channels, num_blocks, stride):
+        strides = [stride] + [1] * (num_blocks - 1)   #strides=[1,1]
+        layers = []
+        for stride in strides:
+            layers.append(block(self.inchannel, channels, stride))
+            self.inchannel = channels
+        return nn.Sequential(*layers)
+
+    def features(self, x):
+        out = self.conv1(x)
+        out = self.layer1(out)
+        out = self.layer2(out)
+        out = self.layer3(out)
+        out = F.avg_pool2d(out, out.size()[3])
+        return out.view(out.size(0), -1)
+
+
+def resnet_classifier(out):
+    filter = [64, 128, 256, 512, 512]
+    return nn.Sequential(
+        nn.Linear(filter[-3], filter[-4]),  #256->128
+        nn.ReLU(inplace=True),
+        nn.Linear(filter[-4],filter[-5]),   #128->64
+        nn.ReLU(inplace=True),
+        nn.Linear(filter[-5], out),
+    )
+
+
+class ResNetLabelGenerator(LabelGenerator, ResNetTrunk):
+    def __init__(self, psi, grouped=None):
+        super(ResNetLabelGenerator, self).__init__(psi, grouped)
+
+        # define convolution block in ResNet-32
+        self.build_trunk(ResidualBlock)
+        # define fc-layers in ResNet-32 (output auxiliary classes \sum_i\psi[i])
+        self.classifier = resnet_classifier(int(np.sum(self.class_nb)))
+        batch_norm_init(self, nn.init.xavier_normal_)
+
+    def forward(self, x, y):
+        predict = self.classifier(self.features(x))
+        return self.label_softmax(predict, y)
+
+
+class ResNet(MultiTaskNetwork, ResNetTrunk):
+    def __init__(self, ResidualBlock, psi):
+        super(ResNet, self).__init__()
+        self.build_trunk(ResidualBlock)
+
+        # primary task prediction
+        # modification: change the classifier's layer number
+        self.classifier1 = resnet_classifier(len(psi))
+        # auxiliary task prediction
+        self.classifier2 = resnet_classifier(int(np.sum(psi)))
+        batch_norm_init(self, nn.init.xavier_uniform_)
+
+    def predict(self, x):
+        out = self.features(x)
+        t1_pred = self.classifier1(out)
+        t2_pred = self.classifier2(out)
+
+        return t1_pred, t2_pred
+
+
+def ResNet32(psi):
+
+    return ResNet(ResidualBlock,psi)
@@ -0,0 +1,94 @@
+import torch
+import torch.nn.functional as F
+
+
+def psi_mask(psi):
+    """
+        build the binary auxiliary-class mask by psi: row i is 1 on the psi[i] auxiliary classes
+        belonging to primary class i, and epsilon=1e-8 everywhere else to avoid nans.
+    """
+    psi = torch.as_tensor(psi, dtype=torch.int64)
+    owner = torch.repeat_interleave(torch.arange(len(psi)), psi)
+    index = torch.full((len(psi), len(owner)), 1e-8)
+    index[owner, torch.arange(len(owner))] = 1
+    return index
+
+
+def psi_groups(psi):
+    """
+        build the auxiliary-class column table by psi: row i lists the columns of the psi[i] auxiliary
+        classes belonging to primary class i, padded with -1 up to max(psi) for ragged hierarchies.
+    """
+    psi = torch.as_tensor(psi, dtype=torch.int64)
+    offset = torch.cumsum(psi, 0) - psi
+    slot = torch.arange(int(psi.max()))
+    groups = offset[:, None] + slot[None, :]
+    return torch.where(slot[None, :] < psi[:, None], groups, torch.full_like(groups, -1))
+
+
+def grouped_log_softmax(x, y, groups):
+    """
+        log-softmax over the auxiliary classes of each sample's primary class y only.
+        returns the compact (batch, max(psi)) log-probabilities and the columns of x they belong to,
+        padding slots of ragged hierarchies hold -inf with column -1.
+    """
+    cols = groups[y]
+    logits = x.gather(1, cols.clamp(min=0)).masked_fill(cols < 0, float('-inf'))
+    return F.log_softmax(logits, dim=1), cols
+
+
+def grouped_softmax(x, y, groups):
+    """
+        masked softmax evaluated on the psi[y] auxiliary classes of each sample and scattered back into
+        a dense (batch, sum(psi)) assignment, exactly zero outside the sample's group.
+        only faster than the dense masked softmax from about 120 auxiliary classes on (see models.GROUPED_MIN_CLASSES),
+        at the shipped psi = [3] * 10 the gather and scatter make it slower.
+    """
+    log_prob, cols = grouped_log_softmax(x, y, groups)
+    return torch.zeros_like(x).scatter_add(1, cols.clamp(min=0), log_prob.exp())
+
+
+def focal_loss(x, target):
+    """
+        focal loss from logits against integer class labels: -(1 - p_t)^2 * log(p_t),
+        computed from the gathered target column of a log-softmax without building a one-hot vector.
+    """
+    log_prob = F.log_softmax(x, dim=1).gather(1, target.unsqueeze(1)).squeeze(1)
+    return -(1 - log_prob.exp()) ** 2 * log_prob
+
+
+def soft_focal_loss(x, target):
+    """
+        focal loss from logits against soft-assignment targets (the generated auxiliary labels).
+    """
+    log_prob = F.log_softmax(x, dim=1)
+    return -torch.sum(target * (1 - log_prob.exp()) ** 2 * log_prob, dim=1)
+
+
+def hierarchy_table(mapping):
+    """
+        compile a {fine label: coarse label} dict into an integer lookup table indexed by the fine label.
+    """
+    return torch.tensor([mapping[i] for i in range(len(mapping))], dtype=torch.int64)
+
+
+class LabelHierarchy(object):
+    """
+        coarse/fine label hierarchy applied as a single indexing op on whatever device the labels live on:
+        calling it on a batch of fine labels returns the (batch, 2) [coarse, fine] targets, coarse() the coarse ones only.
+    """
+    def __init__(self, mapping):
+        self.table = hierarchy_table(mapping)
+        self.device_tables = {}
+
+    def _device_table(self, device):
+        table = self.device_tables.get(device)
+        if table is None:
+            table = self.device_tables[device] = self.table.to(device)
+        return table
+
+    def __call__(self, label):
+        return torch.stack((self._device_table(label.device)[label], label), dim=1)
+
+    def coarse(self, label):
+        return self._device_table(label.device)[label]
@@ -0,0 +1,61 @@
+import os
+
+import torch
+from torch.profiler import profile, schedule, ProfilerActivity
+
+from maxl.timing import record_ranges
+
+
+class StepProfiler(object):
+    """
+        torch.profiler over one window of training steps, step() is called after every batch (see train_epoch):
+        the first `wait` steps are skipped, `warmup` more are traced and discarded, the next `active` steps are recorded.
+        the window is written to directory as a chrome trace (trace.json, open in chrome://tracing or perfetto) and
+        operator tables sorted by self time (ops.txt), then the profiler stops, so the rest of the run is not slowed down.
+        close() ends a window the run was too short to complete, exporting the steps recorded so far.
+        the phases of the MAXL steps show up as maxl/<phase> ranges (see timing.phase).
+    """
+    def __init__(self, directory, wait=1, warmup=1, active=3):
+        self.directory = directory
+        self.skipped = wait + warmup
+        self.active = active
+        self.length = wait + warmup + active
+        self.steps = 0
+        self.activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if torch.cuda.is_available() else [])
+        self.profiler = profile(activities=self.activities, schedule=schedule(wait=wait, warmup=warmup, active=active),
+                                on_trace_ready=self.export, record_shapes=True)
+        self.profiler.start()
+        record_ranges(True)
+
+    def step(self):
+        if self.steps >= self.length:
+            return
+        self.steps += 1
+        self.profiler.step()
+        if self.steps == self.length:
+            self.profiler.stop()
+            record_ranges(False)
+
+    def close(self):
+        if self.steps >= self.length:
+            return
+        recorded = self.steps > self.skipped
+        # stopping inside the active part of the window hands the recorded steps to export()
+        self.active = max(0, self.steps - self.skipped)
+        self.steps = self.length
+        self.profiler.stop()
+        record_ranges(False)
+        if not recorded:
+            print('no training steps profiled, the run ended within the first {} (wait + warmup) steps'.format(self.skipped))
+
+    def export(self, profiler):
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.export_chrome_trace(os.path.join(self.directory, 'trace.json'))
+
+        sort_by = 'self_device_time_total' if ProfilerActivity.CUDA in self.activities else 'self_cpu_time_total'
+        with open(os.path.join(self.directory, 'ops.txt'), 'w') as f:
+            f.write(profiler.key_averages().table(sort_by=sort_by, row_limit=50))
+            f.write('\n\nby input shape\n')
+            f.write(profiler.key_averages(group_by_input_shape=True).table(sort_by=sort_by, row_limit=50))
+            f.write('\n')
+        print('profile of {} training steps written to {}'.format(self.active, self.directory))
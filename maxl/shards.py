@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+
+import numpy as np
+import torch
+import torch.utils.data as data
+import torchvision
+import torchvision.transforms as transforms
+
+from maxl.data import make_loader
+
+
+def convert_image_folder(source, directory, shard_size=10000):
+    """
+        one-time conversion of an ImageFolder split into contiguous uint8 NCHW shards:
+        directory/shard_XXXXX_images.npy, shard_XXXXX_labels.npy and meta.json with the class names,
+        the shard lengths and the per-channel mean/std of the split (on the ToTensor [0, 1] scale).
+    """
+    dataset = torchvision.datasets.ImageFolder(source, transform=transforms.PILToTensor())
+    os.makedirs(directory, exist_ok=True)
+
+    shards = []
+    total, pixels, sums, squares = 0, 0, 0, 0
+    for i, (images, labels) in enumerate(make_loader(dataset, shard_size)):
+        name = 'shard_{:05d}'.format(i)
+        np.save(os.path.join(directory, name + '_images.npy'), images.numpy())
+        np.save(os.path.join(directory, name + '_labels.npy'), labels.numpy())
+        shards.append({'name': name, 'length': len(labels)})
+
+        images = images.double().div_(255)
+        total += len(labels)
+        pixels += images[:, 0].numel()
+        sums = sums + images.sum((0, 2, 3))
+        squares = squares + images.pow(2).sum((0, 2, 3))
+        print('converted {} / {} images'.format(total, len(dataset)))
+
+    mean = sums / pixels
+    std = (squares / pixels - mean ** 2).sqrt()
+    meta = {'classes': dataset.classes, 'shards': shards, 'mean': mean.tolist(), 'std': std.tolist()}
+    # meta.json is written last, its presence marks a complete conversion
+    with open(os.path.join(directory, 'meta.json.tmp'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(os.path.join(directory, 'meta.json.tmp'), os.path.join(directory, 'meta.json'))
+
+
+class ShardedDataset(data.Dataset):
+    """
+        memory-mapped shards written by convert_image_folder, indexed by a whole batch of indices at once
+        (use with make_loader(..., batched=True)), transform is applied to the uint8 image batch.
+        mean and std hold the per-channel statistics stored with the shards.
+    """
+    def __init__(self, directory, transform=None):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        self.classes = meta['classes']
+        self.mean, self.std = meta['mean'], meta['std']
+        self.transform = transform
+
+        self.images = [torch.from_numpy(np.load(os.path.join(directory, shard['name'] + '_images.npy'), mmap_mode='c'))
+                       for shard in meta['shards']]
+        self.labels = torch.cat([torch.from_numpy(np.load(os.path.join(directory, shard['name'] + '_labels.npy')))
+                                 for shard in meta['shards']])
+        self.offsets = torch.tensor([0] + [shard['length'] for shard in meta['shards']]).cumsum(0)
+
+    def __getitem__(self, index):
+        index = torch.as_tensor(index)
+        shard = torch.searchsorted(self.offsets, index, right=True) - 1
+        images = torch.empty((len(index),) + self.images[0].shape[1:], dtype=torch.uint8)
+        for i in shard.unique().tolist():
+            mask = shard == i
+            images[mask] = self.images[i][index[mask] - self.offsets[i]]
+        if self.transform is not None:
+            images = self.transform(images)
+        return images, self.labels[index]
+
+    def __len__(self):
+        return len(self.labels)
+
+
+def open_shards(directory, source=None, transform=None):
+    """
+        ShardedDataset over directory, converting the ImageFolder split at source first if no shards exist yet.
+    """
+    if source is not None and not os.path.exists(os.path.join(directory, 'meta.json')):
+        convert_image_folder(source, directory)
+    return ShardedDataset(directory, transform)
+
+
+if __name__ == '__main__':
+    # python -m maxl.shards <image folder split> <shard directory>
+    convert_image_folder(sys.argv[1], sys.argv[2])
@@ -0,0 +1,194 @@
+import os
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+import torch
+from torch.profiler import record_function
+
+
+# phases of a MAXL step, in report order: backward is the theta_1 step, meta_grad the multi-task gradient
+# (create_graph=True for the second-order meta gradient), meta_backward the theta_2 (label generator) update
+PHASES = ('data', 'forward', 'cos_probe', 'backward', 'gen_forward', 'meta_grad', 'fast_forward', 'meta_backward')
+
+
+def rss():
+    """
+        resident set size of the process in bytes: the current one on linux, the peak one on other unix systems,
+        None where neither is available (windows).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macos, in kilobytes elsewhere
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def reset_peak_rss():
+    """
+        reset the resident set high-water mark of the process to its current rss (linux only),
+        returns whether it was reset, i.e. whether peak_rss() measures the peak from now on.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return peak_rss() is not None
+
+
+def peak_rss():
+    """
+        resident set high-water mark of the process in bytes since the last reset_peak_rss() (VmHWM), None off linux.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class PhaseTimer(object):
+    """
+        wall time and sample counts per training phase (see PHASES), summed until reset().
+        on a cuda device every phase boundary synchronises the device, so the time of the queued kernels is
+        charged to the phase that launched them: the timer costs some throughput and is meant for profiling runs.
+        memory=True also records, per phase and as the maximum over its runs, the peak process rss during the phase
+        above the rss at its start (peak_rss, the memory the phase itself takes) and as an absolute value (hwm_rss),
+        both linux only, elsewhere end_rss: rss() at the end of the phase,
+        the peak cuda allocated / reserved memory during the phase (cuda devices only) and the bytes of the tensors
+        the phase saved for backward (through autograd saved-tensor hooks, tensors saved more than once, such as
+        parameters, count every time).
+    """
+    def __init__(self, device=None, memory=False):
+        self.device = torch.device(device) if device is not None else None
+        self.memory = memory
+        self.reset()
+
+    def reset(self):
+        self.seconds = OrderedDict((name, 0.0) for name in PHASES)
+        self.samples = OrderedDict((name, 0) for name in PHASES)
+        self.peaks = OrderedDict((name, {}) for name in PHASES)
+
+    def _cuda(self):
+        return self.device is not None and self.device.type == 'cuda'
+
+    def _sync(self):
+        if self._cuda():
+            torch.cuda.synchronize(self.device)
+
+    @contextmanager
+    def phase(self, name, samples=0):
+        if not self.memory:
+            self._sync()
+            start = time.perf_counter()
+            yield
+            self._sync()
+            self.seconds[name] += time.perf_counter() - start
+            self.samples[name] += samples
+            return
+
+        saved = [0]
+
+        def pack(tensor):
+            saved[0] += tensor.numel() * tensor.element_size()
+            return tensor
+
+        self._sync()
+        if self._cuda():
+            torch.cuda.reset_peak_memory_stats(self.device)
+        hwm = reset_peak_rss()
+        start_rss = rss() if hwm else None
+        start = time.perf_counter()
+        with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+            yield
+        self._sync()
+        self.seconds[name] += time.perf_counter() - start
+        self.samples[name] += samples
+
+        if hwm:
+            peak = peak_rss()
+            peaks = {'peak_rss': peak - start_rss, 'hwm_rss': peak}
+        else:
+            peaks = {'end_rss': rss()}
+        peaks['saved'] = saved[0]
+        if self._cuda():
+            peaks.update(allocated=torch.cuda.max_memory_allocated(self.device),
+                         reserved=torch.cuda.max_memory_reserved(self.device))
+        for key, value in peaks.items():
+            if value is not None:
+                self.peaks[name][key] = max(self.peaks[name].get(key, 0), value)
+
+    def batches(self, loader, prepare):
+        """
+            prepare(*batch) of every batch of loader, loading and preparing is charged to the data phase.
+        """
+        iterator = iter(loader)
+        while True:
+            with self.phase('data'):
+                batch = next(iterator, None)
+                if batch is not None:
+                    batch = prepare(*batch)
+            if batch is None:
+                return
+            self.samples['data'] += len(batch[1])
+            yield batch
+
+    def summary(self):
+        """
+            {phase: (seconds, samples per second)} of the phases that ran.
+        """
+        return OrderedDict((name, (seconds, self.samples[name] / seconds))
+                           for name, seconds in self.seconds.items() if seconds > 0)
+
+    def memory_summary(self):
+        """
+            {phase: {'peak_rss', 'hwm_rss' or 'end_rss', 'saved', 'allocated', 'reserved': bytes}} of the phases that ran
+            (memory=True only).
+        """
+        return OrderedDict((name, peaks) for name, peaks in self.peaks.items() if peaks)
+
+    def report(self):
+        report = ' | '.join('{} {:.2f}s {:.0f}/s'.format(name, seconds, rate) for name, (seconds, rate) in self.summary().items())
+        if self.memory:
+            report += '\nMEMORY [MB]: ' + ' | '.join(
+                '{} {}'.format(name, ' '.join('{} {:.0f}'.format(key, value / 2 ** 20) for key, value in peaks.items()))
+                for name, peaks in self.memory_summary().items())
+        return report
+
+
+@contextmanager
+def _profiled(name, block):
+    with record_function('maxl/' + name), block:
+        yield
+
+
+# set through record_ranges() by a profiling.StepProfiler while its window runs
+_record_ranges = False
+
+
+def record_ranges(enabled):
+    global _record_ranges
+    _record_ranges = enabled
+
+
+def phase(timer, name, samples=0):
+    # timed block if a timer is given, a no-op otherwise, and a maxl/<name> range while a StepProfiler records
+    block = nullcontext() if timer is None else timer.phase(name, samples)
+    return _profiled(name, block) if _record_ranges else block
+
+
+def batches(loader, prepare, timer=None):
+    if timer is not None:
+        return timer.batches(loader, prepare)
+    return (prepare(*batch) for batch in loader)
@@ -0,0 +1,312 @@
+from collections import OrderedDict
+
+import torch
+import torch.nn.functional as F
+
+from maxl.metrics import MetricSums
+from maxl.timing import phase, batches
+
+
+def gradient_cosine(model, loss1, loss2):
+    """
+        mean cosine similarity between the gradients of the primary and auxiliary loss,
+        computed on the shared representation only (task-specific classifier layers are ignored).
+        both gradients come from a single batched backward, the multi-task gradient (their sum) is returned with it.
+    """
+    names, params = zip(*model.named_parameters())
+    losses = torch.stack((torch.mean(loss1), torch.mean(loss2)))
+    grads = torch.autograd.grad(losses, params, grad_outputs=torch.eye(2, device=losses.device), retain_graph=True,
+                                is_grads_batched=True, materialize_grads=True)
+    shared = [grad for name, grad in zip(names, grads) if not name.startswith('classifier')]
+    cos_mean = 0
+    for grad in shared:
+        cos_mean += torch.mean(F.cosine_similarity(grad[0], grad[1], dim=0)) / len(shared)
+    return [grad.sum(0) for grad in grads], cos_mean
+
+
+def device_rng_state(device):
+    # state of the generator the dropout masks of a forward on device are drawn from
+    return torch.cuda.get_rng_state(device) if device.type == 'cuda' else torch.get_rng_state()
+
+
+def set_device_rng_state(state, device):
+    if device.type == 'cuda':
+        torch.cuda.set_rng_state(state, device)
+    else:
+        torch.set_rng_state(state)
+
+
+def meta_update(model, gen_optimizer, data, label, grads, entropy, lr, timer=None):
+    """
+        second-derivative step: compute theta_1^+ by applying sgd with the multi-task gradient (built with
+        create_graph=True), evaluate the primary loss with theta_1^+ and update theta_2 with primary loss + entropy loss.
+    """
+    with phase(timer, 'fast_forward', len(label)):
+        fast_weights = OrderedDict((name, param - lr * grad) for ((name, param), grad) in zip(model.named_parameters(), grads))
+
+        # compute primary loss with the updated theta_1^+
+        pred1, pred2 = model.forward(data, fast_weights)
+        loss1 = model.model_fit(pred1, label, pri=True)
+
+    # update theta_2 with primary loss + entropy loss
+    with phase(timer, 'meta_backward', len(label)):
+        (torch.mean(loss1) + 0.2 * torch.mean(entropy)).backward()
+        gen_optimizer.step()
+    return pred1, loss1
+
+
+def finite_difference_update(model, gen_optimizer, data, label, grads, pred3, entropy, lr, epsilon=0.01, rng=None,
+                             timer=None):
+    """
+        first-order meta step: the second derivative is replaced by a finite-difference hessian-vector estimate
+        (as in DARTS), so no second-order graph is retained. with v the gradient of the primary loss at theta_1^+,
+        d L_pri / d theta_2 ~ -lr * (d L_aux(theta_1 + eps * v) - d L_aux(theta_1 - eps * v)) / (2 * eps) / d theta_2.
+        rng is the rng state (see device_rng_state) the multi-task forward started from: both perturbed forwards replay
+        its dropout masks, so the estimate differentiates the same network as the exact second derivative.
+        without it they share the current state. the global rng is left untouched either way.
+    """
+    with phase(timer, 'fast_forward', len(label)):
+        fast_weights = OrderedDict((name, (param.detach() - lr * grad).requires_grad_()) for ((name, param), grad) in zip(model.named_parameters(), grads))
+
+        # compute primary loss and its gradient v with the updated theta_1^+
+        pred1, pred2 = model.forward(data, fast_weights)
+        loss1 = model.model_fit(pred1, label, pri=True)
+
+    with phase(timer, 'meta_backward', len(label)):
+        v = torch.autograd.grad(torch.mean(loss1), list(fast_weights.values()), allow_unused=True)
+        eps = epsilon / torch.cat([grad.view(-1) for grad in v if grad is not None]).norm()
+
+        # auxiliary predictions at theta_1 +/- eps * v, the label generator is the only part carrying a graph.
+        # both forwards draw the same dropout masks, otherwise the difference quotient is mostly mask noise over eps
+        if rng is None:
+            rng = device_rng_state(data.device)
+        aux_pred = []
+        with torch.no_grad():
+            for sign in (1, -1):
+                weights = OrderedDict((name, param if grad is None else param + sign * eps * grad)
+                                      for ((name, param), grad) in zip(model.named_parameters(), v))
+                with torch.random.fork_rng(devices=[data.device] if data.is_cuda else []):
+                    set_device_rng_state(rng, data.device)
+                    aux_pred.append(model.forward(data, weights)[1])
+        aux_loss_plus = torch.mean(model.model_fit(aux_pred[0], pred3, pri=False))
+        aux_loss_minus = torch.mean(model.model_fit(aux_pred[1], pred3, pri=False))
+
+        # update theta_2 with the estimated primary loss gradient + entropy loss
+        (-lr * (aux_loss_plus - aux_loss_minus) / (2 * eps) + 0.2 * torch.mean(entropy)).backward()
+        gen_optimizer.step()
+    return pred1, loss1
+
+
+def multi_task_gradient(model, gen_optimizer, data, label, loss1, loss2, pred3, entropy, lr, meta_grad, rng=None,
+                        timer=None):
+    """
+        gradient of the multi-task loss on theta_1 and the theta_2 update built on it,
+        exact second derivative for meta_grad='second-order', finite-difference estimate for 'finite-difference'
+        (rng: the rng state the multi-task forward started from, see finite_difference_update).
+    """
+    if meta_grad not in ('second-order', 'finite-difference'):
+        raise ValueError('Unknown meta-gradient mode: {}'.format(meta_grad))
+
+    train_loss = torch.mean(loss1) + torch.mean(loss2)
+    with phase(timer, 'meta_grad', len(label)):
+        # create_graph flag for computing second-derivative
+        grads = torch.autograd.grad(train_loss, model.parameters(), create_graph=meta_grad == 'second-order')
+    if meta_grad == 'second-order':
+        meta_pred1, meta_loss1 = meta_update(model, gen_optimizer, data, label, grads, entropy, lr, timer=timer)
+    else:
+        meta_pred1, meta_loss1 = finite_difference_update(model, gen_optimizer, data, label, grads, pred3, entropy, lr,
+                                                          rng=rng, timer=timer)
+    return grads, meta_pred1, meta_loss1
+
+
+def train_step(model, label_generator, optimizer, gen_optimizer, data, label, probe=False, timer=None):
+    """
+        training step, update theta_1 with the primary loss and the auxiliary loss on generated labels.
+        probe=True also measures the gradient cosine similarity (None otherwise), reusing its gradients for the update.
+    """
+    with phase(timer, 'forward', len(label)):
+        pred1, pred2 = model(data)
+
+    # the label generator only provides targets here, theta_2 is updated in the meta-training step
+    with phase(timer, 'gen_forward', len(label)), torch.no_grad():
+        pred3 = label_generator(data, label)
+
+    with phase(timer, 'forward'):
+        # reset optimizers with zero gradient
+        optimizer.zero_grad()
+        gen_optimizer.zero_grad()
+
+        loss1 = model.model_fit(pred1, label, pri=True)
+        loss2 = model.model_fit(pred2, pred3, pri=False)
+
+    if probe:
+        # the probe gradients are the update, only the optimizer step is left for the backward phase
+        with phase(timer, 'cos_probe', len(label)):
+            grads, cos_mean = gradient_cosine(model, loss1, loss2)
+            for param, grad in zip(model.parameters(), grads):
+                param.grad = grad
+    else:
+        cos_mean = None
+    with phase(timer, 'backward', len(label)):
+        if not probe:
+            train_loss = torch.mean(loss1) + torch.mean(loss2)
+            train_loss.backward()
+        optimizer.step()
+    return pred1, loss1, cos_mean
+
+
+def meta_forward(model, label_generator, optimizer, gen_optimizer, data, label, meta_grad, timer=None):
+    """
+        forward of both networks for a theta_2 update: returns the primary predictions, the generated labels,
+        the primary, auxiliary and entropy losses and the rng state the forward started from (see device_rng_state).
+    """
+    with phase(timer, 'forward', len(label)):
+        # the finite-difference estimate replays the dropout masks of this forward
+        rng = device_rng_state(data.device)
+        pred1, pred2 = model(data)
+    with phase(timer, 'gen_forward', len(label)):
+        pred3 = label_generator(data, label)
+
+    with phase(timer, 'forward'):
+        # reset optimizers with zero gradient
+        optimizer.zero_grad()
+        gen_optimizer.zero_grad()
+
+        loss1 = model.model_fit(pred1, label, pri=True)
+        # the finite-difference estimate only needs the graph of the generated labels for the theta_2 update
+        loss2 = model.model_fit(pred2, pred3 if meta_grad == 'second-order' else pred3.detach(), pri=False)
+        loss3 = model.model_entropy(pred3)
+    return pred1, pred3, loss1, loss2, loss3, rng
+
+
+def meta_step(model, label_generator, optimizer, gen_optimizer, data, label, lr, meta_grad='second-order', timer=None):
+    """
+        meta-training step, update theta_2 through the derivative of the primary loss after one sgd step on theta_1.
+    """
+    pred1, pred3, loss1, loss2, loss3, rng = meta_forward(model, label_generator, optimizer, gen_optimizer, data, label,
+                                                          meta_grad, timer=timer)
+
+    # multi-task loss, its gradient on theta_1 drives the theta_2 update
+    grads, meta_pred1, meta_loss1 = multi_task_gradient(model, gen_optimizer, data, label, loss1, loss2, pred3, loss3, lr,
+                                                        meta_grad, rng=rng, timer=timer)
+    return pred1, loss1, meta_pred1, meta_loss1
+
+
+def fused_step(model, label_generator, optimizer, gen_optimizer, data, label, lr, meta_grad='second-order', probe=False,
+               timer=None):
+    """
+        single-pass step: one forward of both networks drives the meta-training step (theta_2) and
+        the training step (theta_1), which reuses the multi-task gradient built for the second derivative.
+        probe=True also measures the gradient cosine similarity (None otherwise).
+    """
+    pred1, pred3, loss1, loss2, loss3, rng = meta_forward(model, label_generator, optimizer, gen_optimizer, data, label,
+                                                          meta_grad, timer=timer)
+    cos_mean = None
+    if probe:
+        with phase(timer, 'cos_probe', len(label)):
+            cos_mean = gradient_cosine(model, loss1, loss2)[1]
+
+    # multi-task loss, its gradient on theta_1 drives the theta_2 update
+    grads, meta_pred1, meta_loss1 = multi_task_gradient(model, gen_optimizer, data, label, loss1, loss2, pred3, loss3, lr,
+                                                        meta_grad, rng=rng, timer=timer)
+
+    # update theta_1 with the same multi-task gradient
+    with phase(timer, 'backward', len(label)):
+        for param, grad in zip(model.parameters(), grads):
+            param.grad = grad.detach()
+        optimizer.step()
+    return pred1, loss1, cos_mean, meta_pred1, meta_loss1
+
+
+def correct(pred, label):
+    # number of correct predictions, stays on the device, MetricSums only synchronises at epoch end
+    return pred.detach().max(1)[1].eq(label).sum()
+
+
+def train_epoch(model, label_generator, optimizer, gen_optimizer, loader, prepare, lr, single_pass=False,
+                meta_grad='second-order', cos_every=0, on_batch=None, resume=None, timer=None, profiler=None):
+    """
+        one MAXL epoch over loader, returns the averaged training columns
+        [PRI loss, PRI acc, COSSIM, META PRE loss, PRE acc, AFTER loss, AFTER acc].
+        prepare maps a loaded batch to (data, primary label) on the training device.
+        by default the training step (theta_1) runs over all batches before the meta-training step (theta_2)
+        passes over the data again, single_pass=True drives both steps from every mini-batch instead.
+        meta_grad selects the exact second-order meta-gradient or its first-order finite-difference estimate.
+        COSSIM is averaged over probe steps only: the first batch the epoch processes (a resumed epoch probes again
+        only if its restored metrics hold no probe yet), and every cos_every-th batch if set.
+        losses and accuracies are means over all samples of the epoch (ragged last batch included),
+        summed on the training device and only copied back once, at the end of the epoch.
+        on_batch(progress) is called after every batch with the epoch state at that batch boundary
+        (pass, batches and samples done in the pass, metric sums), resume=progress continues an epoch from there,
+        the loader is then expected to serve the rest of that pass only (see checkpoint.ResumableSampler).
+        timer (a timing.PhaseTimer) accumulates the wall time and samples of every phase of the steps,
+        profiler (a profiling.StepProfiler) is stepped after every batch.
+    """
+    metrics = MetricSums(7)
+    start_pass, start_batch, samples = 0, 0, 0
+    if resume is not None:
+        metrics.load_state_dict(resume['metrics'])
+        start_pass, start_batch, samples = resume['pass'], resume['batch'], resume['samples']
+
+    if single_pass:
+        for i, (data, label) in enumerate(batches(loader, prepare, timer), start_batch):
+            probe = not metrics.counts[2] or (cos_every and i % cos_every == 0)
+            pred1, loss1, cos_mean, meta_pred1, meta_loss1 = fused_step(model, label_generator, optimizer, gen_optimizer, data, label, lr, meta_grad, probe,
+                                                                        timer=timer)
+
+            loss, acc = torch.sum(loss1), correct(pred1, label)
+            metrics.add(0, loss, acc, count=len(label))
+            metrics.add(3, loss, acc, torch.sum(meta_loss1), correct(meta_pred1, label), count=len(label))
+            if probe:
+                metrics.add(2, cos_mean)
+            samples += len(label)
+            if on_batch is not None:
+                on_batch({'pass': 0, 'batch': i + 1, 'samples': samples, 'metrics': metrics.state_dict()})
+            if profiler is not None:
+                profiler.step()
+        return metrics.mean()
+
+    # evaluate training data (training-step, update on theta_1)
+    if start_pass == 0:
+        for i, (data, label) in enumerate(batches(loader, prepare, timer), start_batch):
+            probe = not metrics.counts[2] or (cos_every and i % cos_every == 0)
+            pred1, loss1, cos_mean = train_step(model, label_generator, optimizer, gen_optimizer, data, label, probe, timer=timer)
+
+            metrics.add(0, torch.sum(loss1), correct(pred1, label), count=len(label))
+            if probe:
+                metrics.add(2, cos_mean)
+            samples += len(label)
+            if on_batch is not None:
+                on_batch({'pass': 0, 'batch': i + 1, 'samples': samples, 'metrics': metrics.state_dict()})
+            if profiler is not None:
+                profiler.step()
+        start_batch, samples = 0, 0
+
+    # evaluating training data (meta-training step, update on theta_2)
+    for i, (data, label) in enumerate(batches(loader, prepare, timer), start_batch):
+        pred1, loss1, meta_pred1, meta_loss1 = meta_step(model, label_generator, optimizer, gen_optimizer, data, label, lr, meta_grad,
+                                                         timer=timer)
+
+        # accuracy on primary task before and after one update
+        metrics.add(3, torch.sum(loss1), correct(pred1, label), torch.sum(meta_loss1), correct(meta_pred1, label),
+                    count=len(label))
+        samples += len(label)
+        if on_batch is not None:
+            on_batch({'pass': 1, 'batch': i + 1, 'samples': samples, 'metrics': metrics.state_dict()})
+        if profiler is not None:
+            profiler.step()
+    return metrics.mean()
+
+
+def evaluate(model, loader, prepare):
+    """
+        evaluate the primary task on loader, returns the per-sample means [loss, acc].
+    """
+    metrics = MetricSums(2)
+    with torch.no_grad():
+        for batch in loader:
+            data, label = prepare(*batch)
+            pred1, pred2 = model(data)
+            loss1 = model.model_fit(pred1, label, pri=True)
+            metrics.add(0, torch.sum(loss1), correct(pred1, label), count=len(label))
+    return metrics.mean()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the maxl package lives at the repository root (the training scripts import it the same way)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,131 @@
+import os
+
+import torch
+import torch.nn as nn
+import torch.utils.data as data
+
+from maxl.checkpoint import Checkpoint, CheckpointWriter, ResumableSampler
+from maxl.data import BatchTransform, PackedDataset
+
+
+def test_resumable_sampler_resumes_mid_pass():
+    sampler = ResumableSampler(range(10), seed=4)
+    first, second = list(sampler), list(sampler)
+    assert sorted(first) == list(range(10)) and first != second
+
+    # interrupted after 3 samples of the first pass
+    sampler = ResumableSampler(range(10), seed=4)
+    iter(sampler)
+    state = sampler.state_dict(3)
+    resumed = ResumableSampler(range(10), seed=0)
+    resumed.load_state_dict(state)
+    assert len(resumed) == 7
+    assert list(resumed) == first[3:]
+    assert list(resumed) == second
+
+
+def test_resumable_sampler_resumes_between_passes():
+    sampler = ResumableSampler(range(10), seed=4)
+    _, second = list(sampler), list(sampler)
+
+    sampler = ResumableSampler(range(10), seed=4)
+    list(sampler)
+    resumed = ResumableSampler(range(10), seed=0)
+    resumed.load_state_dict(sampler.state_dict())
+    assert list(resumed) == second
+
+
+def augmented_batches(sampler, transform, passes, batch_size=64):
+    # the batches a packed loader serves over passes iterations of sampler, augmented by transform
+    images = torch.randint(256, (250, 3, 8, 8), generator=torch.Generator().manual_seed(0), dtype=torch.uint8)
+    dataset = PackedDataset(images, torch.arange(250), transform)
+    return [dataset[batch][0] for _ in range(passes) for batch in data.BatchSampler(sampler, batch_size, drop_last=False)]
+
+
+def test_resumed_batch_augmentation_matches_uninterrupted_run():
+    # 250 samples in batches of 64: every pass ends on a ragged batch of 58
+    expected = augmented_batches(ResumableSampler(range(250), seed=4), BatchTransform((0.5,) * 3, (0.2,) * 3, 2, True, seed=3), 2)
+    done = 0
+    for passes in range(2):
+        # interrupted after every batch of the pass, the last one included
+        for consumed in (64, 128, 192, 250):
+            done += 1
+            resumed = ResumableSampler(range(250), seed=0)
+            resumed.load_state_dict({'seed': 4, 'passes': passes, 'start': consumed})
+            transform = BatchTransform((0.5,) * 3, (0.2,) * 3, 2, True, seed=3)
+            transform.batch = resumed.batches(64)
+            assert transform.batch == done
+
+            batches = augmented_batches(resumed, transform, 2 - passes)
+            assert len(batches) == len(expected) - done
+            for batch, reference in zip(batches, expected[done:]):
+                assert torch.equal(batch, reference)
+
+
+def test_checkpoint_restores_objects_rng_and_values(tmp_path):
+    torch.manual_seed(0)
+    model, sampler = nn.Linear(3, 2), ResumableSampler(range(10), seed=1)
+    iter(sampler)
+    checkpoint = Checkpoint(str(tmp_path / 'state.pth'), model=model, sampler=sampler)
+    checkpoint.save({'samples': 4}, epoch=2)
+    expected = torch.rand(3)
+
+    restored_model, restored_sampler = nn.Linear(3, 2), ResumableSampler(range(10), seed=0)
+    progress, values = Checkpoint(str(tmp_path / 'state.pth'), model=restored_model, sampler=restored_sampler).load()
+    assert progress == {'samples': 4} and values == {'epoch': 2}
+    assert torch.equal(restored_model.weight, model.weight)
+    assert list(restored_sampler) == list(ResumableSampler(range(10), seed=1))[4:]
+    assert torch.equal(torch.rand(3), expected)
+
+
+def saved(tmp_path):
+    return sorted(name for name in os.listdir(str(tmp_path)) if name.endswith('.pth'))
+
+
+def save_all(writer, tmp_path, saves):
+    for name, score in saves:
+        writer.save(str(tmp_path / name), {'name': name}, series='net', score=score)
+
+
+def test_writer_keeps_only_the_last_file_with_keep_1(tmp_path):
+    writer = CheckpointWriter(keep=1)
+    save_all(writer, tmp_path, [('a.pth', None), ('b.pth', None), ('c.pth', None)])
+    # saving the same path again replaces it, it does not drop it
+    save_all(writer, tmp_path, [('c.pth', None)])
+    writer.close()
+    assert saved(tmp_path) == ['c.pth']
+    assert torch.load(str(tmp_path / 'c.pth'))['name'] == 'c.pth'
+
+
+def test_writer_keeps_the_best_file_while_it_ages_out(tmp_path):
+    writer = CheckpointWriter(keep=2)
+    save_all(writer, tmp_path, [('a.pth', 0.9), ('b.pth', 0.1), ('c.pth', 0.2), ('d.pth', 0.3), ('e.pth', 0.4)])
+    writer.close()
+    assert saved(tmp_path) == ['a.pth', 'd.pth', 'e.pth']
+
+    # a better score replaces the best, the old best then goes like any other file
+    writer = CheckpointWriter(keep=2)
+    save_all(writer, tmp_path, [('a.pth', 0.9), ('b.pth', 0.1), ('c.pth', 0.95), ('d.pth', 0.3), ('e.pth', 0.4)])
+    writer.close()
+    assert saved(tmp_path) == ['c.pth', 'd.pth', 'e.pth']
+
+
+def test_writer_without_scores_keeps_no_best(tmp_path):
+    writer = CheckpointWriter(keep=2)
+    save_all(writer, tmp_path, [('a.pth', None), ('b.pth', None), ('c.pth', None)])
+    writer.close()
+    assert saved(tmp_path) == ['b.pth', 'c.pth'] and writer.state_dict()['best'] == {}
+
+
+def test_writer_state_dict_round_trip(tmp_path):
+    writer = CheckpointWriter(keep=2)
+    save_all(writer, tmp_path, [('a.pth', 0.9), ('b.pth', 0.1), ('c.pth', 0.2)])
+    writer.close()
+
+    # a resumed run continues the retention of the files saved before the interruption
+    resumed = CheckpointWriter(keep=2)
+    resumed.load_state_dict(writer.state_dict())
+    assert resumed.state_dict() == writer.state_dict()
+    save_all(resumed, tmp_path, [('d.pth', 0.3)])
+    resumed.close()
+    assert saved(tmp_path) == ['a.pth', 'c.pth', 'd.pth']
@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import torch
+import torchvision.transforms as transforms
+import torchvision.transforms.functional as TF
+
+from maxl.data import BatchTransform, stratified_subset, load_packed, packed_svhn, PackedDataset
+
+
+MEAN, STD = (0.5, 0.4, 0.3), (0.2, 0.25, 0.3)
+
+
+def images(n=6, size=8):
+    return torch.randint(256, (n, 3, size, size), generator=torch.Generator().manual_seed(0), dtype=torch.uint8)
+
+
+def test_batch_transform_matches_to_tensor_and_normalize():
+    batch = images()
+    expected = torch.stack([transforms.Normalize(MEAN, STD)(TF.to_tensor(image.permute(1, 2, 0).numpy())) for image in batch])
+    assert torch.allclose(BatchTransform(MEAN, STD)(batch), expected, atol=1e-5)
+
+
+def test_batch_transform_crops_and_flips_like_torchvision():
+    batch, padding = images(), 2
+    transform = BatchTransform(MEAN, STD, padding=padding, flip=True, seed=3)
+    result = transform(batch)
+    assert result.is_contiguous()
+
+    # the same draws as the transform (first batch: generator seeded with seed + 0), applied image by image
+    generator = torch.Generator().manual_seed(3)
+    offsets = torch.randint(2 * padding + 1, (len(batch), 2), generator=generator)
+    flips = torch.rand(len(batch), 1, generator=generator) < 0.5
+    for image, (top, left), flip, out in zip(batch, offsets.tolist(), flips[:, 0].tolist(), result):
+        crop = TF.crop(TF.pad(image, padding), top, left, image.shape[1], image.shape[2])
+        if flip:
+            crop = TF.hflip(crop)
+        expected = transforms.Normalize(MEAN, STD)(crop.float() / 255)
+        assert torch.allclose(out, expected, atol=1e-5)
+
+
+def test_batch_transform_seed_reproduces_every_batch():
+    batch = images()
+    first, second = BatchTransform(MEAN, STD, padding=2, flip=True, seed=5), BatchTransform(MEAN, STD, padding=2, flip=True, seed=5)
+    outputs = [first(batch) for _ in range(3)]
+    assert not torch.equal(outputs[0], outputs[1])
+    for output in outputs:
+        assert torch.equal(second(batch), output)
+
+
+def test_stratified_subset_quotas_follow_the_class_shares():
+    # shares of 10 samples: 5.0, 3.33, 1.67 -> the rounding remainder goes to the largest fraction (class 2)
+    labels = np.repeat([0, 1, 2], [30, 20, 10])
+    indices = stratified_subset(labels, 10, seed=1)
+
+    assert np.all(np.diff(indices) > 0)
+    assert np.bincount(labels[indices], minlength=3).tolist() == [5, 3, 2]
+    assert np.array_equal(stratified_subset(labels, 10, seed=1), indices)
+    assert len(stratified_subset(labels, 100)) == len(labels)
+
+
+def test_stratified_subset_reuses_the_cached_indices(tmp_path):
+    labels = np.repeat(np.arange(4), 25)
+    path = str(tmp_path / 'subset.npy')
+    indices = stratified_subset(labels, 20, seed=0, path=path)
+
+    # a later call loads the saved subset, whatever seed (or labels) it is given
+    assert np.array_equal(np.load(path), indices)
+    assert np.array_equal(stratified_subset(labels[::-1], 20, seed=9, path=path), indices)
+
+
+def test_load_packed_builds_once_and_memory_maps_the_cache(tmp_path):
+    array, labels = images(10).numpy(), np.arange(10) % 3
+    calls = []
+
+    def build():
+        calls.append(1)
+        return array, labels
+
+    # the cache directory does not exist yet
+    path = str(tmp_path / 'cache' / 'cifar10_train')
+    for _ in range(2):
+        packed_images, packed_labels = load_packed(path, build)
+        assert packed_images.dtype == torch.uint8 and packed_labels.dtype == torch.int64
+        assert np.array_equal(packed_images.numpy(), array) and np.array_equal(packed_labels.numpy(), labels)
+    assert len(calls) == 1
+    assert not any(name.endswith('.tmp') for name in os.listdir(str(tmp_path / 'cache')))
+
+    dataset = PackedDataset(packed_images, packed_labels, transform=BatchTransform(MEAN, STD))
+    batch, batch_labels = dataset[[7, 2, 9]]
+    assert torch.equal(batch_labels, torch.tensor([1, 2, 0]))
+    assert torch.allclose(batch, BatchTransform(MEAN, STD)(torch.from_numpy(array[[7, 2, 9]])))
+
+
+def test_packed_svhn_reads_an_existing_cache(tmp_path):
+    # with the cache in place the .mat file is never parsed (nor downloaded)
+    np.save(str(tmp_path / 'svhn_test_images.npy'), images(5).numpy())
+    np.save(str(tmp_path / 'svhn_test_labels.npy'), np.arange(5, dtype=np.int64))
+    dataset = packed_svhn(str(tmp_path), 'test')
+
+    assert len(dataset) == 5
+    batch, labels = dataset[[4, 0]]
+    assert torch.equal(batch, images(5)[[4, 0]]) and torch.equal(labels, torch.tensor([4, 0]))
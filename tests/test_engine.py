@@ -0,0 +1,68 @@
+import pytest
+import torch.nn as nn
+
+from maxl.engine import BACKBONES, DATASETS, configure, parser, primary_psi
+
+
+MNIST_HIERARCHY = {0: 0, 1: 1, 2: 2, 3: 0, 4: 2, 5: 2, 6: 0, 7: 1, 8: 0, 9: 0}
+CIFAR_HIERARCHY = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 1, 6: 2, 7: 2, 8: 2, 9: 2}
+SIMPLECNN = dict(optimizer='adam', lr=1e-3, gen_lr=1e-3, gen_weight_decay=5e-4, step_size=10, gamma=0.5,
+                 meta_lr=1e-3, meta_lr_every=10, schedule_first=False, epochs=30, seed=7, batch_size=128,
+                 primary='fine', hierarchy=MNIST_HIERARCHY)
+CONVNET = dict(optimizer='sgd', lr=0.01, gen_lr=1e-3, gen_weight_decay=5e-4, step_size=50, gamma=0.5, meta_lr=0.01,
+               schedule_first=True, seed=None, primary='fine')
+
+# the values of the original training scripts, (configuration, psi, hidden widths of the auxiliary head)
+BASELINES = {
+    'mnist': (dict(SIMPLECNN, dataset='mnist', backbone='simplecnn'), [3] * 10, [64, 32]),
+    'svhn': (dict(SIMPLECNN, dataset='svhn', backbone='simplecnn'), [3] * 10, [128, 32]),
+    'svhn-validation': (dict(SIMPLECNN, dataset='svhn', backbone='simplecnn-wide', validate='extra', val_samples=20000),
+                        [3] * 10, [128, 64]),
+    # the original loader folded class 0 into class 1, the preset trains on the 10 real classes
+    'cifar10': (dict(CONVNET, dataset='cifar10', backbone='vgg16', epochs=200, meta_lr_every=50, batch_size=100,
+                     hierarchy=CIFAR_HIERARCHY), [3] * 10, [512]),
+    'cinic10-pri3': (dict(CONVNET, dataset='cinic10', backbone='resnet32', epochs=30, meta_lr_every=10, batch_size=128,
+                          hierarchy=CIFAR_HIERARCHY), [3] * 10, [128, 64]),
+    'cinic10-pri5': (dict(CONVNET, dataset='cinic10', backbone='resnet32', epochs=30, meta_lr_every=10, batch_size=128,
+                          hierarchy={0: 0, 1: 1, 2: 2, 3: 2, 4: 3, 5: 2, 6: 3, 7: 4, 8: 0, 9: 1}), [5] * 10, [128, 64]),
+}
+
+
+@pytest.mark.parametrize('preset', sorted(BASELINES))
+def test_presets_resolve_to_the_original_scripts(preset):
+    expected, psi, aux_hidden = BASELINES[preset]
+    config = configure(preset)
+    for key, value in expected.items():
+        assert config[key] == value, key
+    assert primary_psi(config) == psi
+
+    model = BACKBONES[config['backbone']][0](psi, DATASETS[config['dataset']][2])
+    linears = [layer for layer in model.classifier2 if isinstance(layer, nn.Linear)]
+    assert [layer.out_features for layer in linears] == aux_hidden + [sum(psi)]
+
+
+def test_options_override_the_preset():
+    config = configure('cinic10-pri5', epochs=2, psi=[2], primary='coarse')
+    assert config['epochs'] == 2 and config['backbone'] == 'resnet32'
+    # five coarse classes in the pri5 hierarchy
+    assert primary_psi(config) == [2] * 5
+
+    # the command line only sets the options it is given
+    options = vars(parser().parse_args(['--preset', 'mnist', '--hierarchy', '[0, 0, 0, 0, 0, 1, 1, 1, 1, 1]']))
+    config = configure(options.pop('preset'), **{key: value for key, value in options.items() if key != 'sweep'})
+    assert config['hierarchy'] == {fine: fine // 5 for fine in range(10)} and config['seed'] == 7
+
+    with pytest.raises(ValueError):
+        configure('mnist', epoch=3)
+    with pytest.raises(ValueError):
+        primary_psi(configure('mnist', psi=[3, 3]))
+
+
+def test_non_contiguous_hierarchies_are_rejected():
+    # a fine label without a coarse one
+    with pytest.raises(ValueError):
+        configure('cifar10', hierarchy={fine: 0 for fine in range(9)})
+    # coarse labels with a gap (no coarse class 1)
+    with pytest.raises(ValueError):
+        configure('cifar10', hierarchy=[0] * 5 + [2] * 5)
+    assert configure('cifar10', hierarchy=[0] * 5 + [1] * 5)['hierarchy'] == {fine: fine // 5 for fine in range(10)}
@@ -0,0 +1,24 @@
+import torch
+import torch.nn as nn
+
+from maxl.functional import functional_forward
+
+
+def test_functional_forward_matches_module_and_keeps_its_running_stats():
+    torch.manual_seed(0)
+    module = nn.Sequential(nn.Conv2d(3, 8, 3, padding=1), nn.BatchNorm2d(8), nn.ReLU(), nn.Flatten(), nn.Linear(8 * 6 * 6, 4))
+    x = torch.randn(5, 3, 6, 6)
+    buffers = {name: buffer.clone() for name, buffer in module.named_buffers()}
+
+    # twice: the second call reuses the batch-norm substitutions of the first
+    outputs = [functional_forward(module, module.named_parameters(), x) for _ in range(2)]
+    for name, buffer in module.named_buffers():
+        assert torch.equal(buffer, buffers[name])
+
+    expected = module(x)
+    for output in outputs:
+        assert torch.allclose(output, expected, atol=1e-6)
+
+    # in eval mode as well, batch norm normalises with the batch statistics (as the train-mode module does)
+    module.eval()
+    assert torch.allclose(functional_forward(module, module.named_parameters(), x), expected, atol=1e-6)
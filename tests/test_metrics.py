@@ -0,0 +1,51 @@
+import warnings
+
+import numpy as np
+import torch
+
+from maxl.metrics import MetricSums
+
+
+def test_mean_is_the_per_sample_mean_over_a_ragged_last_batch():
+    torch.manual_seed(0)
+    loss, correct = torch.rand(250), torch.rand(250) < 0.5
+    metrics = MetricSums(3)
+    for start in range(0, 250, 64):
+        # the last batch holds 58 samples
+        batch = slice(start, start + 64)
+        metrics.add(0, loss[batch].sum(), correct[batch].sum(), count=len(loss[batch]))
+    # a per-step column (such as COSSIM) is averaged over its own adds
+    metrics.add(2, 0.2)
+    metrics.add(2, 0.4)
+
+    mean = metrics.mean()
+    assert np.allclose(mean, [loss.mean().item(), correct.float().mean().item(), 0.3])
+    assert metrics.counts.tolist() == [250, 250, 2]
+
+
+def test_mean_of_a_column_without_samples_is_zero():
+    metrics = MetricSums(2)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        assert metrics.mean().tolist() == [0, 0]
+        metrics.add(0, torch.tensor(3.0), count=2)
+        assert metrics.mean().tolist() == [1.5, 0]
+
+
+def test_sums_stay_on_the_device_and_round_trip_through_state_dict():
+    metrics = MetricSums(2)
+    metrics.add(0, torch.tensor(4.0), torch.tensor(3), count=4)
+    # accumulated as a tensor, only mean() copies it back
+    assert torch.is_tensor(metrics.sums)
+
+    state = metrics.state_dict()
+    resumed = MetricSums(2)
+    resumed.load_state_dict(state)
+    for sums in (metrics, resumed):
+        sums.add(0, torch.tensor(2.0), torch.tensor(1), count=2)
+    # the restored sums are a copy, the two continue independently to the same result
+    assert np.allclose(resumed.mean(), [1.0, 4 / 6]) and np.allclose(metrics.mean(), resumed.mean())
+
+    empty = MetricSums(2)
+    empty.load_state_dict(MetricSums(2).state_dict())
+    assert empty.mean().tolist() == [0, 0]
@@ -0,0 +1,67 @@
+import torch
+
+from maxl.models import LabelGenerator
+from maxl.ops import psi_mask, psi_groups, grouped_log_softmax, grouped_softmax, focal_loss, soft_focal_loss
+
+
+PSI = [2, 3, 1, 4]
+
+
+def dense_softmax(x, y, psi):
+    # the original formulation: softmax over all sum(psi) classes with the psi-mask row of each sample
+    mask = psi_mask(psi)[y]
+    return torch.exp(x) * mask / torch.sum(torch.exp(x) * mask, dim=1, keepdim=True)
+
+
+def probability_focal_loss(x, target):
+    # the original formulation: focal loss on softmax probabilities against a one-hot or soft target
+    x_pred = torch.softmax(x, dim=1)
+    return torch.sum(-target * (1 - x_pred) ** 2 * torch.log(x_pred + 1e-20), dim=1)
+
+
+def test_psi_groups_pads_ragged_hierarchies():
+    assert psi_groups(PSI).tolist() == [[0, 1, -1, -1], [2, 3, 4, -1], [5, -1, -1, -1], [6, 7, 8, 9]]
+
+
+def test_grouped_log_softmax_normalises_each_group():
+    torch.manual_seed(0)
+    x, y = torch.randn(16, sum(PSI)), torch.randint(len(PSI), (16,))
+    log_prob, cols = grouped_log_softmax(x, y, psi_groups(PSI))
+
+    assert torch.equal(cols, psi_groups(PSI)[y])
+    assert torch.all(log_prob[cols < 0] == float('-inf'))
+    assert torch.allclose(torch.logsumexp(log_prob, dim=1), torch.zeros(16), atol=1e-6)
+
+
+def test_grouped_softmax_matches_dense_psi_mask_softmax():
+    torch.manual_seed(0)
+    x, y = torch.randn(64, sum(PSI)), torch.randint(len(PSI), (64,))
+    grouped = grouped_softmax(x, y, psi_groups(PSI))
+
+    # exactly zero outside each sample's group, the dense version leaks epsilon-weighted mass there
+    assert torch.all(grouped[psi_mask(PSI)[y] < 1] == 0)
+    assert torch.allclose(grouped, dense_softmax(x, y, PSI), atol=1e-5)
+
+
+def test_focal_losses_from_logits_match_the_probability_formula():
+    torch.manual_seed(0)
+    x = (3 * torch.randn(64, sum(PSI))).requires_grad_()
+    label, soft = torch.randint(sum(PSI), (64,)), torch.softmax(torch.randn(64, sum(PSI)), dim=1)
+    onehot = torch.zeros(64, sum(PSI)).scatter_(1, label.unsqueeze(1), 1)
+
+    for loss, reference in ((focal_loss(x, label), probability_focal_loss(x, onehot)),
+                            (soft_focal_loss(x, soft), probability_focal_loss(x, soft))):
+        assert torch.allclose(loss, reference, atol=1e-5)
+        grad, expected = (torch.autograd.grad(torch.mean(value), x)[0] for value in (loss, reference))
+        assert torch.allclose(grad, expected, atol=1e-6)
+
+
+def test_label_generator_picks_the_softmax_by_the_number_of_auxiliary_classes():
+    assert not LabelGenerator([3] * 10).grouped
+    assert LabelGenerator([20] * 10).grouped
+    assert LabelGenerator([3] * 10, grouped=True).grouped
+
+    torch.manual_seed(0)
+    x, y = torch.randn(16, sum(PSI)), torch.randint(len(PSI), (16,))
+    assert torch.allclose(LabelGenerator(PSI, grouped=True).label_softmax(x, y),
+                          LabelGenerator(PSI, grouped=False).label_softmax(x, y), atol=1e-5)
@@ -0,0 +1,45 @@
+import json
+import os
+
+import numpy as np
+import torch
+from PIL import Image
+
+from maxl.shards import convert_image_folder, open_shards
+
+
+def image_folder(root, n=7):
+    # n random 4x4 rgb pngs, alternating between two classes, returns them as a uint8 NCHW batch in folder order
+    generator = torch.Generator().manual_seed(0)
+    images = torch.randint(256, (n, 4, 4, 3), generator=generator, dtype=torch.uint8)
+    for i, image in enumerate(images):
+        folder = os.path.join(root, 'class_{}'.format(i % 2))
+        os.makedirs(folder, exist_ok=True)
+        Image.fromarray(image.numpy()).save(os.path.join(folder, '{}.png'.format(i)))
+    # ImageFolder order: class by class, files sorted by name
+    order = [i for c in range(2) for i in range(n) if i % 2 == c]
+    return images[order].permute(0, 3, 1, 2), torch.tensor([i % 2 for i in order])
+
+
+def test_shards_round_trip_an_image_folder(tmp_path):
+    images, labels = image_folder(str(tmp_path / 'train'))
+    convert_image_folder(str(tmp_path / 'train'), str(tmp_path / 'shards'), shard_size=3)
+    dataset = open_shards(str(tmp_path / 'shards'))
+
+    # 7 images in shards of 3, 3 and 1
+    assert dataset.offsets.tolist() == [0, 3, 6, 7]
+    assert len(dataset) == 7 and dataset.classes == ['class_0', 'class_1']
+
+    batch, batch_labels = dataset[list(range(7))]
+    assert torch.equal(batch, images) and torch.equal(batch_labels, labels)
+    # indices on both sides of every shard boundary, out of order
+    index = [3, 2, 6, 5, 0]
+    batch, batch_labels = dataset[index]
+    assert torch.equal(batch, images[index]) and torch.equal(batch_labels, labels[index])
+
+    pixels = images.double().div(255)
+    with open(str(tmp_path / 'shards' / 'meta.json')) as f:
+        meta = json.load(f)
+    assert np.allclose(meta['mean'], pixels.mean((0, 2, 3)).numpy())
+    assert np.allclose(meta['std'], pixels.std((0, 2, 3), unbiased=False).numpy())
+    assert dataset.mean == meta['mean'] and dataset.std == meta['std']
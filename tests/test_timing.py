@@ -0,0 +1,27 @@
+import os
+
+import pytest
+import torch
+
+from maxl.timing import PhaseTimer, reset_peak_rss
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/clear_refs'), reason='linux only')
+def test_phase_peak_rss_is_reset_at_every_phase():
+    timer = PhaseTimer(memory=True)
+    if not reset_peak_rss():
+        pytest.skip('the rss high-water mark cannot be reset here')
+
+    with timer.phase('forward'):
+        # 256 MB, touched and freed within the phase
+        ones = torch.ones(2 ** 26)
+        del ones
+    with timer.phase('backward'):
+        pass
+
+    peaks = timer.memory_summary()
+    assert 'end_rss' not in peaks['forward']
+    # the peak above the rss at the phase start: the phase's own allocation, not the memory already resident
+    assert peaks['forward']['peak_rss'] > 200 * 2 ** 20
+    assert peaks['backward']['peak_rss'] < 50 * 2 ** 20
+    assert peaks['forward']['hwm_rss'] >= peaks['forward']['peak_rss']
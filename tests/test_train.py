@@ -0,0 +1,78 @@
+import torch
+import torch.nn.functional as F
+
+from maxl.models import mnist_simple_cnn, mnist_label_generator
+from maxl.train import gradient_cosine, train_step, meta_step, fused_step
+
+
+def networks(lr=0.1):
+    # MNIST SimpleCNN and its label generator (both in train mode, with dropout) and their sgd optimizers
+    torch.manual_seed(0)
+    psi = [2] * 10
+    model, label_generator = mnist_simple_cnn(psi), mnist_label_generator(psi)
+    return (model, label_generator, torch.optim.SGD(model.parameters(), lr=lr),
+            torch.optim.SGD(label_generator.parameters(), lr=lr))
+
+
+def batch():
+    generator = torch.Generator().manual_seed(1)
+    return torch.rand(32, 1, 28, 28, generator=generator), torch.randint(10, (32,), generator=generator)
+
+
+def test_gradient_cosine_matches_separate_task_gradients():
+    model, label_generator, _, _ = networks()
+    data, label = batch()
+    pred1, pred2 = model(data)
+    loss1 = model.model_fit(pred1, label, pri=True)
+    loss2 = model.model_fit(pred2, label_generator(data, label).detach(), pri=False)
+    grads, cos_mean = gradient_cosine(model, loss1, loss2)
+
+    names, params = zip(*model.named_parameters())
+    grads1, grads2 = (torch.autograd.grad(torch.mean(loss), params, retain_graph=True, allow_unused=True,
+                                          materialize_grads=True) for loss in (loss1, loss2))
+    # the classifier heads are task specific, each one only receives the gradient of its own task
+    shared = [(grad1, grad2) for name, grad1, grad2 in zip(names, grads1, grads2) if not name.startswith('classifier')]
+    assert len(shared) == 8
+    expected = sum(torch.mean(F.cosine_similarity(grad1, grad2, dim=0)) for grad1, grad2 in shared) / len(shared)
+    assert torch.allclose(cos_mean, expected, atol=1e-5)
+    for grad, grad1, grad2 in zip(grads, grads1, grads2):
+        assert torch.allclose(grad, grad1 + grad2, atol=1e-6)
+
+
+def generator_gradient(meta_grad, seed):
+    # zero learning rates: the steps leave both networks unchanged, the theta_2 gradient stays in .grad
+    model, label_generator, optimizer, gen_optimizer = networks(lr=0)
+    data, label = batch()
+    torch.manual_seed(seed)
+    meta_step(model, label_generator, optimizer, gen_optimizer, data, label, 0.1, meta_grad)
+    return torch.cat([param.grad.view(-1) for param in label_generator.parameters()])
+
+
+def test_finite_difference_matches_second_order_in_train_mode():
+    # both networks apply dropout in train mode, the perturbed forwards must replay the multi-task forward's masks
+    for seed in range(3):
+        exact, estimate = generator_gradient('second-order', seed), generator_gradient('finite-difference', seed)
+        assert F.cosine_similarity(exact, estimate, dim=0) > 0.98
+        assert abs(estimate.norm() / exact.norm() - 1) < 0.05
+
+
+def test_fused_step_matches_train_step_and_meta_step():
+    data, label = batch()
+    fused, trained, meta = networks(), networks(), networks()
+    torch.manual_seed(5)
+    _, loss1, _, _, meta_loss1 = fused_step(*fused, data, label, 0.1)
+
+    # theta_1: the training step on the same batch (same dropout masks and generated labels)
+    torch.manual_seed(5)
+    _, train_loss1, _ = train_step(*trained, data, label)
+    assert torch.allclose(loss1, train_loss1, atol=1e-6)
+    for param, expected in zip(fused[0].parameters(), trained[0].parameters()):
+        assert torch.allclose(param, expected, atol=1e-6)
+
+    # theta_2: the meta-training step, which the fused step runs before theta_1 is updated
+    torch.manual_seed(5)
+    _, _, _, meta_step_loss1 = meta_step(*meta, data, label, 0.1)
+    assert torch.allclose(meta_loss1, meta_step_loss1, atol=1e-6)
+    for param, expected in zip(fused[1].parameters(), meta[1].parameters()):
+        assert torch.allclose(param, expected, atol=1e-6)
+